@@ -0,0 +1,367 @@
+"""
+Offline benchmark harness for the lookup, ranking and optimization hot paths.
+
+API Ninjas is replaced by an in-process stub, the nutrition cache is kept
+in memory and the local food and recipe stores point at a scratch
+directory, so runs are reproducible and never touch the network or the
+user's cache files.
+    
+    python benchmark.py                          # full run, JSON to stdout
+    python benchmark.py --quick -o bench.json    # smaller sizes, save results
+    python benchmark.py --baseline bench.json    # compare; exit 1 on regression
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+import numpy as np
+
+import nutrition_maximizer as nm
+
+FULL_SIZES = {
+    "recipes": [1_000, 10_000, 100_000],
+    "ingredients": [10, 1_000, 10_000, 100_000],
+}
+QUICK_SIZES = {
+    "recipes": [1_000, 10_000],
+    "ingredients": [10, 1_000, 10_000],
+}
+DEFAULT_TOLERANCE = 0.25   # slowdown ratio above which a result counts as a regression
+
+FOODS = sorted({token for name in nm.NUTRITION_DB for token in name.split()} |
+               {"basil", "garlic", "onion", "pepper", "lemon", "ginger", "cumin", "tofu",
+                "lentil", "quinoa", "spinach", "yogurt", "honey", "walnut", "cheese"})
+UNITS = ["cup", "cups", "tbsp", "tsp", "g", "oz", "lb", "pinch", "clove"]
+COOKING = ["raw", "cooked", "fresh", "frozen", "canned", "dried", ""]
+
+# ========================
+# API Stub
+# ========================
+class StubResponse:
+    """Just enough of requests.Response for the lookup code"""
+    
+    def __init__(self, payload, status_code: int = 200):
+        self.payload = payload
+        self.status_code = status_code
+        self.text = json.dumps(payload)
+    
+    def json(self):
+        return self.payload
+
+class StubAPIClient:
+    """Deterministic in-process stand-in for APIClient (no network, no rate limit)"""
+    
+    def __init__(self, recipes: List[nm.Recipe] = ()):
+        self.recipes = list(recipes)
+        self.executor = ThreadPoolExecutor(max_workers=nm.HTTP_MAX_WORKERS)
+        self.calls = 0
+    
+    def get(self, url: str, params: Dict, timeout: float = 15) -> StubResponse:
+        self.calls += 1
+        query = params.get("query", "")
+        if url == nm.NUTRITION_API_URL:
+            return StubResponse([self._nutrition_item(name) for name in query.split(" and ")])
+        rng = random.Random(query)
+        sample = rng.sample(self.recipes, min(10, len(self.recipes)))
+        return StubResponse([{"title": r.title, "ingredients": r.ingredients,
+                              "instructions": r.instructions, "servings": r.servings}
+                             for r in sample])
+    
+    def submit(self, func, *args):
+        return self.executor.submit(func, *args)
+    
+    def map(self, func, items) -> List:
+        def call(item):
+            try:
+                return func(item)
+            except Exception as e:
+                return e
+        return list(self.executor.map(call, items))
+    
+    @staticmethod
+    def _nutrition_item(name: str) -> Dict:
+        rng = random.Random(name)
+        return {"name": name, "serving_size_g": 100.0,
+                "calories": rng.uniform(20, 600), "protein_g": rng.uniform(0, 40),
+                "carbohydrates_total_g": rng.uniform(0, 80), "fat_total_g": rng.uniform(0, 50)}
+
+def install_stub(recipes: List[nm.Recipe] = ()) -> StubAPIClient:
+    """Route every API call through the stub and use a fresh in-memory nutrition cache"""
+    stub = StubAPIClient(recipes)
+    nm._api_client = stub
+    nm._nutrition_cache = nm.NutritionCache(path=None)
+    nm.get_optimization_cache().clear()
+    return stub
+
+def isolate(scratch: str):
+    """Point every on-disk store at `scratch` and stub the API before any group runs"""
+    nm.CACHE_PATH = os.path.join(scratch, "cache.sqlite")
+    nm.LOCAL_FOOD_DB_PATH = os.path.join(scratch, "foods.bin")
+    nm.LOCAL_RECIPE_STORE_PATH = os.path.join(scratch, "recipes.bin")
+    nm._food_db = None
+    nm._local_recipe_store = None
+    install_stub()
+
+# ========================
+# Synthetic Data
+# ========================
+def synthetic_names(count: int, seed: int = 0) -> List[str]:
+    """Food names in the shapes users type ("2 lb fresh chicken breasts")"""
+    rng = random.Random(seed)
+    names = []
+    for i in range(count):
+        words = rng.sample(FOODS, rng.randint(1, 3))
+        amount = f"{rng.randint(1, 500)}{rng.choice(['g', 'oz', 'lb', ' grams'])} " if i % 3 == 0 else ""
+        names.append(f"{amount}{rng.choice(COOKING)} {' '.join(words)}".strip())
+    return names
+
+def synthetic_recipes(count: int, seed: int = 0) -> List[nm.Recipe]:
+    rng = random.Random(seed)
+    recipes = []
+    for i in range(count):
+        items = rng.sample(FOODS, rng.randint(3, 12))
+        ingredients = "|".join(f"{rng.randint(1, 4)} {rng.choice(UNITS)} {item}" for item in items)
+        recipes.append(nm.Recipe(title=f"{items[0].title()} {items[1]} dish #{i}",
+                                 ingredients=ingredients,
+                                 instructions="Combine everything and cook until done.",
+                                 servings=f"{rng.randint(1, 8)} servings"))
+    return recipes
+
+def synthetic_ingredients(count: int, seed: int = 0) -> List[nm.Ingredient]:
+    rng = random.Random(seed)
+    return [nm.Ingredient(f"food {i}", rng.uniform(10, 500), rng.uniform(0.1, 9.0),
+                          rng.uniform(0, 0.4), rng.uniform(0, 0.8), rng.uniform(0, 0.9))
+            for i in range(count)]
+
+def write_recipe_jsonl(recipes: List[nm.Recipe], path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        for recipe in recipes:
+            f.write(json.dumps({"title": recipe.title, "ingredients": recipe.ingredients,
+                                "instructions": recipe.instructions,
+                                "servings": recipe.servings}) + "\n")
+
+# ========================
+# Timing
+# ========================
+def measure(func: Callable, ops: int = 1, repeat: int = 5, setup: Callable = None,
+            min_time: float = 0.2) -> Dict:
+    """Time func() `repeat` times (after one warm-up); `ops` is work units per call.
+    
+    Each sample loops until min_time has elapsed so fast calls are not
+    dominated by timer resolution; `setup` runs untimed before each call.
+    """
+    if setup is not None:
+        setup()
+    func()
+    samples = []
+    for _ in range(repeat):
+        calls, elapsed = 0, 0.0
+        while elapsed < min_time or calls == 0:
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            func()
+            elapsed += time.perf_counter() - start
+            calls += 1
+        samples.append(elapsed / calls)
+    median = statistics.median(samples)
+    return {"median_s": median, "min_s": min(samples), "max_s": max(samples),
+            "ops": ops, "per_op_s": median / ops, "ops_per_s": ops / median if median else None}
+
+# ========================
+# Benchmarks
+# ========================
+def bench_clean_food_name(results: Dict, sizes: Dict):
+    names = synthetic_names(10_000)
+    
+    warm_names = names[:nm.CLEAN_NAME_CACHE_SIZE // 2]   # fits in the memo cache
+    
+    def clean_all(batch):
+        for name in batch:
+            nm.clean_food_name(name)
+    
+    results["clean_food_name.cold"] = measure(lambda: clean_all(names), ops=len(names),
+                                              setup=nm.clean_food_name.cache_clear)
+    results["clean_food_name.warm"] = measure(lambda: clean_all(warm_names), ops=len(warm_names))
+    results["normalize_many"] = measure(lambda: nm.normalize_many(names), ops=len(names))
+
+def bench_fetch_nutrition(results: Dict, sizes: Dict):
+    db_names = list(nm.NUTRITION_DB)
+    fuzzy_names = [f"{name}s" for name in db_names if " " not in name]
+    unknown = [f"stub food {i}" for i in range(1_000)]
+    install_stub()
+    
+    def fetch_all(names):
+        for name in names:
+            nm.fetch_nutrition_api(name)
+    
+    results["fetch_nutrition_api.local_db"] = measure(lambda: fetch_all(db_names), ops=len(db_names))
+    results["fetch_nutrition_api.fuzzy_db"] = measure(lambda: fetch_all(fuzzy_names),
+                                                      ops=len(fuzzy_names))
+    results["fetch_nutrition_api.stub_miss"] = measure(
+        lambda: fetch_all(unknown), ops=len(unknown), repeat=3, min_time=0,
+        setup=lambda: (nm.get_nutrition_cache().clear(), nm.clean_food_name.cache_clear()))
+    fetch_all(unknown)
+    results["fetch_nutrition_api.cache_hit"] = measure(lambda: fetch_all(unknown), ops=len(unknown))
+    results["resolve_nutrition_bulk.stub_miss"] = measure(
+        lambda: list(nm.resolve_nutrition_bulk(unknown)), ops=len(unknown), repeat=3, min_time=0,
+        setup=nm.get_nutrition_cache().clear)
+
+def bench_ranking(results: Dict, sizes: Dict):
+    query = ["chicken breast", "rice", "broccoli", "olive oil"]
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in sizes["recipes"]:
+            recipes = synthetic_recipes(count)
+            results[f"recipe_index.build[{count}]"] = measure(
+                lambda: nm.RecipeIndex(recipes), ops=count, repeat=3)
+            index = nm.RecipeIndex(recipes)
+            results[f"recipe_index.search[{count}]"] = measure(lambda: index.search(query, k=5))
+            results[f"analyze_recipes.local[{count}]"] = measure(
+                lambda: nm.analyze_recipes(recipes, use_api=False), ops=count, repeat=3,
+                setup=nm.parse_ingredient_line.cache_clear)
+            
+            source = os.path.join(tmp, f"recipes_{count}.jsonl")
+            store_path = os.path.join(tmp, f"recipes_{count}.bin")
+            write_recipe_jsonl(recipes, source)
+            results[f"recipe_store.build[{count}]"] = measure(
+                lambda: nm.build_recipe_store(source, store_path), ops=count, repeat=3, min_time=0)
+            results[f"recipe_store.open_search[{count}]"] = measure(
+                lambda: nm.LocalRecipeStore(store_path).search(query, k=5))
+            
+            # Full search path: offline corpus first, then stubbed API queries + ranking
+            nm._local_recipe_store = nm.LocalRecipeStore(store_path)
+            nm.OFFLINE_MODE = True
+            results[f"search_recipes_by_ingredients.offline[{count}]"] = measure(
+                lambda: nm.search_recipes_by_ingredients(query, "protein"))
+            nm.OFFLINE_MODE = False
+            install_stub(recipes)
+            results[f"search_recipes_by_ingredients.stub_api[{count}]"] = measure(
+                lambda: nm.search_recipes_by_ingredients(query, "protein"))
+            nm._local_recipe_store = None
+
+def bench_optimization(results: Dict, sizes: Dict):
+    for count in sizes["ingredients"]:
+        ingredients = synthetic_ingredients(count)
+        table = nm.IngredientTable.from_ingredients(ingredients)
+        cap = 2_000.0
+        results[f"optimize_recipe_portions[{count}]"] = measure(
+            lambda: nm.optimize_recipe_portions(None, ingredients, cap, "protein"), ops=count)
+        results[f"optimize_recipe_portions.table[{count}]"] = measure(
+            lambda: nm.optimize_recipe_portions(None, table, cap, "protein"), ops=count)
+        caps = list(np.linspace(200, 4_000, 50))
+        results[f"optimize_scenarios.150[{count}]"] = measure(
+            lambda: nm.optimize_scenarios(table, caps), ops=150)
+        results[f"pareto_frontier[{count}]"] = measure(
+            lambda: nm.pareto_frontier(table, "protein"), ops=count)
+        if count <= 1_000:
+            constraints = nm.PortionConstraints(max_calories=cap, nutrient_max={"fat": 60.0})
+            results[f"optimize_recipe_portions.exact_lp[{count}]"] = measure(
+                lambda: nm.optimize_recipe_portions(None, table, cap, "protein", constraints),
+                repeat=3)
+
+def bench_startup(results: Dict, sizes: Dict):
+    """Fresh interpreters: bare import, and the CLI up to its first prompt.
+    
+    HOME points at a scratch directory holding a fresh health-probe entry,
+    so the CLI never reaches for the network.
+    """
+    script = os.path.abspath(nm.__file__)
+    with tempfile.TemporaryDirectory() as home:
+        with open(os.path.join(home, os.path.basename(nm.API_HEALTH_PATH)), "w") as f:
+            json.dump({"key": nm._api_key_fingerprint(), "checked": time.time(),
+                       "working": False, "status": "benchmark"}, f)
+        env = dict(os.environ, HOME=home, PYTHONDONTWRITEBYTECODE="")
+        
+        def run(*args):
+            subprocess.run([sys.executable, *args], cwd=os.path.dirname(script), env=env,
+                           stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL)
+        
+        results["startup.python"] = measure(lambda: run("-c", "pass"), repeat=5, min_time=0)
+        results["startup.import"] = measure(
+            lambda: run("-c", "import nutrition_maximizer"), repeat=5, min_time=0)
+        results["startup.cli_first_prompt"] = measure(lambda: run(script, "--cli"),
+                                                      repeat=5, min_time=0)
+
+BENCHMARKS = {
+    "clean": bench_clean_food_name,
+    "fetch": bench_fetch_nutrition,
+    "ranking": bench_ranking,
+    "optimize": bench_optimization,
+    "startup": bench_startup,
+}
+
+# ========================
+# Reporting
+# ========================
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[Dict]:
+    """Per-benchmark ratios (current / baseline) for benchmarks present in both.
+    
+    Best-of-samples times are compared, as they are the least noisy.
+    """
+    rows = []
+    for name, result in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if before is None or not before.get("min_s"):
+            continue
+        ratio = result["min_s"] / before["min_s"]
+        rows.append({"name": name, "baseline_s": before["min_s"], "current_s": result["min_s"],
+                     "ratio": ratio, "regression": ratio > 1 + tolerance})
+    return rows
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-o", "--output", help="write JSON results to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown before flagging a regression (default 0.25)")
+    parser.add_argument("--quick", action="store_true", help="skip the largest sizes")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS),
+                        help="run only these benchmark groups")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    
+    random.seed(args.seed)
+    sizes = QUICK_SIZES if args.quick else FULL_SIZES
+    results: Dict[str, Dict] = {}
+    with tempfile.TemporaryDirectory() as scratch:
+        isolate(scratch)
+        for group in args.only or BENCHMARKS:
+            print(f"running {group} ...", file=sys.stderr)
+            BENCHMARKS[group](results, sizes)
+    
+    report = {
+        "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                 "python": platform.python_version(), "numpy": np.__version__,
+                 "platform": platform.platform(), "quick": args.quick},
+        "results": results,
+    }
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["comparison"] = compare(report, json.load(f), args.tolerance)
+        for row in report["comparison"]:
+            flag = "REGRESSION" if row["regression"] else "ok"
+            print(f"{row['name']:<55} {row['ratio']:6.2f}x  {flag}", file=sys.stderr)
+        if any(row["regression"] for row in report["comparison"]):
+            exit_code = 1
+    
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return exit_code
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,48 @@
+from __future__ import annotations   # annotations stay strings, so numpy isn't needed to define them
 from typing import List, Dict, Optional
-from dataclasses import dataclass
-import requests
-import json
+from dataclasses import dataclass, field, fields, replace, asdict
+from functools import lru_cache, wraps
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+import atexit
+import bisect
+import contextvars
+import csv
+import hashlib
+import heapq
+import importlib
+import mmap
+import os
+import random
 import re
+import sqlite3
+import sys
 import time
-import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
+import urllib.parse
 import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+
+class _LazyModule:
+    """Placeholder that imports a module on first attribute access.
+    
+    The real module then replaces the placeholder in this module's globals,
+    so later lookups cost nothing extra. Each entry point (GUI, CLI, batch,
+    service) only pays for the heavy imports it actually reaches.
+    """
+    
+    def __init__(self, name: str, alias: str):
+        self._name = name
+        self._alias = alias
+    
+    def __getattr__(self, attr: str):
+        module = importlib.import_module(self._name)
+        globals()[self._alias] = module
+        return getattr(module, attr)
+
+np = _LazyModule("numpy", "np")
+requests = _LazyModule("requests", "requests")
+asyncio = _LazyModule("asyncio", "asyncio")
+json = _LazyModule("json", "json")
 
 # ========================
 # Config
@@ -18,16 +54,318 @@ API_NINJAS_KEY = ""  # Replace with your actual key
 NUTRITION_API_URL = "https://api.api-ninjas.com/v1/nutrition"
 RECIPE_API_URL = "https://api.api-ninjas.com/v1/recipe"
 HEADERS = {"X-Api-Key": API_NINJAS_KEY}
+API_ENDPOINTS = {NUTRITION_API_URL: "nutrition", RECIPE_API_URL: "recipe"}  # metric labels
+
+# Rate limiting (token bucket shared by every thread)
+MIN_REQUEST_INTERVAL = 0.1  # 100ms between requests on average
+RATE_LIMIT_BURST = 5        # requests allowed back-to-back before throttling
+
+# Retries, circuit breaker and deadline budgets for API calls
+API_MAX_RETRIES = 3                         # extra attempts after the first
+API_BACKOFF_BASE = 0.25                     # seconds; doubled per attempt, full jitter
+API_BACKOFF_MAX = 8.0                       # longest wait between attempts (incl. Retry-After)
+API_RETRY_STATUSES = (429, 500, 502, 503, 504)
+BREAKER_FAILURE_THRESHOLD = 5               # consecutive failures before failing fast
+BREAKER_RESET_SECONDS = 30.0                # how long the circuit stays open
+GENERATION_DEADLINE_SECONDS = 20.0          # API budget for one whole generation
+
+# Background API health probe, cached on disk between runs
+API_HEALTH_PATH = os.path.join(os.path.expanduser("~"), ".nutrition_maximizer_health.json")
+API_HEALTH_TTL_SECONDS = 300
+
+# HTTP connection pooling / concurrency
+HTTP_POOL_SIZE = 10
+HTTP_MAX_WORKERS = 5
+NUTRITION_BATCH_SIZE = 10   # foods per combined nutrition query in bulk resolution
+SHOPPING_LIST_DEFAULT_GRAMS = 100.0
+
+# GUI frontier plot next to the calorie slider (pixels)
+FRONTIER_PLOT_WIDTH = 220
+FRONTIER_PLOT_HEIGHT = 80
+
+# GUI background jobs (generation, auto-fill, imports, API checks)
+JOB_MAX_WORKERS = 3
+
+# Batch mode (--batch): JSONL meal requests across a process pool
+BATCH_WORKERS = os.cpu_count() or 1
+BATCH_CHUNK_SIZE = 16       # records per task sent to a worker process
+BATCH_MAX_INFLIGHT = 4      # pending chunks per worker; bounds memory on huge inputs
+
+# Local JSON service (--serve)
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+SERVICE_RECIPE_TTL_SECONDS = 3600
+SERVICE_RECIPE_CACHE_SIZE = 512             # LRU bound on cached recipe searches
+
+# Fuzzy food-name matching against the local database (0..1 confidence).
+# Matches must share the head noun; below the confident threshold a match
+# is only used when the cache and API can't answer.
+FUZZY_MATCH_THRESHOLD = 0.5
+FUZZY_CONFIDENT_THRESHOLD = 0.8
+
+# Memoized food-name normalization
+CLEAN_NAME_CACHE_SIZE = 4096
+
+# Memoized portion optimizations (LRU, keyed on ingredient content + cap + nutrient)
+OPTIMIZATION_CACHE_SIZE = 256
+
+# Offline recipe corpus (build with --import-recipes); used when the API
+# yields nothing, or exclusively when OFFLINE_MODE is set
+LOCAL_RECIPE_STORE_PATH = os.path.join(os.path.expanduser("~"), ".nutrition_maximizer_recipes.bin")
+OFFLINE_MODE = False
+
+# Large offline food table (build with --import-foods); consulted before the API
+LOCAL_FOOD_DB_PATH = os.path.join(os.path.expanduser("~"), ".nutrition_maximizer_foods.bin")
+
+# Persistent nutrition cache (set CACHE_PATH to None for an in-memory cache)
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".nutrition_maximizer_cache.sqlite")
+CACHE_TTL_SECONDS = 7 * 24 * 3600           # keep API answers for a week
+CACHE_NEGATIVE_TTL_SECONDS = 24 * 3600      # retry unknown foods after a day
+CACHE_MAX_ENTRIES = 5000                    # LRU eviction beyond this size
+CACHE_SCHEMA_VERSION = 2                    # bump when the stored nutrition format changes
+CACHE_BUSY_TIMEOUT_SECONDS = 5.0            # wait this long for another process's write lock
+CACHE_ACCESS_RESOLUTION_SECONDS = 60.0      # LRU timestamps are refreshed at most this often
+
+# Opt-in instrumentation (also switched on by --profile)
+METRICS_ENABLED = False
+METRICS_PREFIX = "nutrition_maximizer"
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# ========================
+# Instrumentation
+# ========================
+class Histogram:
+    """Latency histogram with Prometheus-style upper-bound buckets"""
+    
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)   # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+    
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+    
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (capped at the max seen)"""
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen >= q * self.count:
+                return min(bound, self.max)
+        return self.max
+    
+    def cumulative(self) -> List[int]:
+        totals, seen = [], 0
+        for count in self.counts:
+            seen += count
+            totals.append(seen)
+        return totals
+    
+    def to_dict(self) -> Dict:
+        bounds = [str(b) for b in self.buckets] + ["+Inf"]
+        return {"count": self.count, "sum": self.sum, "max": self.max,
+                "buckets": dict(zip(bounds, self.cumulative()))}
+
+class _Span:
+    """Times a with-block into the stage_seconds histogram"""
+    __slots__ = ("metrics", "stage", "start")
+    
+    def __init__(self, metrics: "Metrics", stage: str):
+        self.metrics = metrics
+        self.stage = stage
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        self.metrics.observe("stage_seconds", time.perf_counter() - self.start, stage=self.stage)
 
-# Rate limiting
-LAST_REQUEST_TIME = 0
-MIN_REQUEST_INTERVAL = 0.1  # 100ms between requests
+class _NullSpan:
+    __slots__ = ()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return None
+
+_NULL_SPAN = _NullSpan()
+
+def _escape_label(value) -> str:
+    """Escape a label value for the Prometheus text format"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class Metrics:
+    """Opt-in counters, per-stage timing spans and per-endpoint latency histograms.
+    
+    Every call is a no-op while ``enabled`` is False. Spans nest, so a
+    stage's time includes the stages inside it.
+    """
+    
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self.counters: Dict[tuple, float] = {}
+            self.histograms: Dict[tuple, Histogram] = {}
+    
+    @staticmethod
+    def _key(name: str, labels: Dict) -> tuple:
+        return (name, tuple(sorted(labels.items())))
+    
+    def inc(self, name: str, amount: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+    
+    def observe(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+    
+    def span(self, stage: str):
+        """Context manager timing one stage (shared no-op object when disabled)"""
+        return _Span(self, stage) if self.enabled else _NULL_SPAN
+    
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "counters": [{"name": name, "labels": dict(labels), "value": value}
+                             for (name, labels), value in sorted(self.counters.items())],
+                "histograms": [{"name": name, "labels": dict(labels), **histogram.to_dict()}
+                               for (name, labels), histogram in sorted(self.histograms.items())],
+            }
+    
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+    
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format"""
+        def labels_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in pairs) + "}"
+        
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                metric = f"{METRICS_PREFIX}_{name}"
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} counter")
+                    typed.add(metric)
+                lines.append(f"{metric}{labels_text(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                metric = f"{METRICS_PREFIX}_{name}"
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} histogram")
+                    typed.add(metric)
+                bounds = [str(b) for b in histogram.buckets] + ["+Inf"]
+                for bound, count in zip(bounds, histogram.cumulative()):
+                    lines.append(f"{metric}_bucket{labels_text(labels, [('le', bound)])} {count}")
+                lines.append(f"{metric}_sum{labels_text(labels)} {histogram.sum}")
+                lines.append(f"{metric}_count{labels_text(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+    
+    def breakdown(self) -> str:
+        """Human-readable per-stage / per-endpoint timing table plus counters"""
+        lines = [f"{'stage':<32}{'calls':>7}{'total s':>10}{'mean ms':>10}{'p95 ms':>10}"]
+        with self._lock:
+            rows = sorted(self.histograms.items(), key=lambda item: -item[1].sum)
+            for (name, labels), histogram in rows:
+                label = ",".join(str(v) for _, v in labels)
+                title = label if name == "stage_seconds" else f"{name}[{label}]"
+                lines.append(f"{title:<32}{histogram.count:>7}{histogram.sum:>10.3f}"
+                             f"{1000 * histogram.sum / histogram.count:>10.1f}"
+                             f"{1000 * histogram.quantile(0.95):>10.1f}")
+            for (name, labels), value in sorted(self.counters.items()):
+                label = ",".join(f"{k}={v}" for k, v in labels)
+                lines.append(f"{name}{{{label}}} = {value:g}")
+        return "\n".join(lines)
+
+METRICS = Metrics()
+
+def timed(stage: str):
+    """Decorator: record each call of the function as a span"""
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with METRICS.span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def start_profiling(cprofile_path: Optional[str] = None):
+    """Enable metrics (and cProfile when a path is given); print the breakdown at exit"""
+    METRICS.enabled = True
+    profiler = None
+    if cprofile_path:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    
+    def report():
+        if profiler is not None:
+            import pstats
+            profiler.disable()
+            profiler.dump_stats(cprofile_path)
+            print(f"\n📈 cProfile data written to {cprofile_path}; top functions:")
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+        print("\n⏱️ Per-stage breakdown:")
+        print(METRICS.breakdown())
+    
+    atexit.register(report)
 
 # ========================
 # Data Model
 # ========================
-@dataclass
+def _slotted(*extra: str):
+    """Rebuild a frozen dataclass with __slots__ (dataclass(slots=True) needs Python 3.10).
+    
+    ``extra`` names additional slots for cached derived values; they are
+    not dataclass fields, so they stay out of eq/hash/repr/asdict.
+    """
+    def wrap(cls):
+        names = tuple(f.name for f in fields(cls))
+        namespace = {key: value for key, value in cls.__dict__.items()
+                     if key not in names + ("__dict__", "__weakref__")}
+        namespace["__slots__"] = names + extra
+        
+        # Frozen instances reject setattr, so pickling/copying restores fields directly
+        def __getstate__(self):
+            return tuple(getattr(self, name) for name in names)
+        
+        def __setstate__(self, state):
+            for name, value in zip(names, state):
+                object.__setattr__(self, name, value)
+        
+        namespace["__getstate__"] = __getstate__
+        namespace["__setstate__"] = __setstate__
+        return type(cls)(cls.__name__, cls.__bases__, namespace)
+    return wrap
+
+@_slotted("_protein_density", "_carbs_density", "_fat_density")
+@dataclass(frozen=True)
 class Ingredient:
+    """Immutable, hashable ingredient; nutrient densities are kept in slots once computed"""
     name: str
     quantity: float      # grams available
     calories: float      # per gram
@@ -36,10 +374,23 @@ class Ingredient:
     fat: float           # per gram
 
     def nutritional_score(self, nutrient: str) -> float:
-        nutrient_value = getattr(self, nutrient)
-        return nutrient_value / self.calories if self.calories > 0 else 0.0
+        slot = _INGREDIENT_DENSITY.get(nutrient)
+        if slot is None:
+            nutrient_value = getattr(self, nutrient)
+            return nutrient_value / self.calories if self.calories > 0 else 0.0
+        try:
+            return slot.__get__(self)
+        except AttributeError:  # first use: compute once and keep it in the slot
+            density = getattr(self, nutrient) / self.calories if self.calories > 0 else 0.0
+            object.__setattr__(self, slot.__name__, density)
+            return density
 
-@dataclass
+# Slot descriptors for nutritional_score, avoiding a string getattr per call
+_INGREDIENT_DENSITY = {nutrient: Ingredient.__dict__[f"_{nutrient}_density"]
+                       for nutrient in ("protein", "carbs", "fat")}
+
+@_slotted()
+@dataclass(frozen=True)
 class Recipe:
     title: str
     ingredients: str
@@ -47,6 +398,144 @@ class Recipe:
     servings: str
     nutrition_score: float = 0.0
 
+# ========================
+# Columnar Ingredient Store
+# ========================
+NUTRIENT_FIELDS = ("calories", "protein", "carbs", "fat")
+MACRO_CALORIES = {"protein": 4, "carbs": 4, "fat": 9}
+
+class IngredientTable:
+    """Struct-of-arrays ingredient store for batched scoring and optimization.
+    
+    Quantity and per-gram nutrients live in contiguous float64 arrays, so
+    scoring, sorting and totals are single NumPy operations instead of a
+    Python loop over Ingredient objects.
+    """
+    
+    def __init__(self, names: List[str], quantity, calories, protein, carbs, fat):
+        self.names = list(names)
+        self.quantity = np.ascontiguousarray(quantity, dtype=np.float64)
+        self.calories = np.ascontiguousarray(calories, dtype=np.float64)
+        self.protein = np.ascontiguousarray(protein, dtype=np.float64)
+        self.carbs = np.ascontiguousarray(carbs, dtype=np.float64)
+        self.fat = np.ascontiguousarray(fat, dtype=np.float64)
+        self.index = {name: i for i, name in enumerate(self.names)}
+    
+    @classmethod
+    def from_ingredients(cls, ingredients: List[Ingredient]) -> "IngredientTable":
+        return cls([ing.name for ing in ingredients],
+                   [ing.quantity for ing in ingredients],
+                   [ing.calories for ing in ingredients],
+                   [ing.protein for ing in ingredients],
+                   [ing.carbs for ing in ingredients],
+                   [ing.fat for ing in ingredients])
+    
+    @classmethod
+    def coerce(cls, ingredients) -> "IngredientTable":
+        """Accept either an IngredientTable or a list of Ingredient objects"""
+        return ingredients if isinstance(ingredients, cls) else cls.from_ingredients(ingredients)
+    
+    def to_ingredients(self) -> List[Ingredient]:
+        return [Ingredient(name, float(q), float(cal), float(p), float(c), float(f))
+                for name, q, cal, p, c, f in zip(self.names, self.quantity, self.calories,
+                                                 self.protein, self.carbs, self.fat)]
+    
+    def __len__(self) -> int:
+        return len(self.names)
+    
+    def append(self, ingredient: Ingredient) -> int:
+        """Add a row and return its index"""
+        self.names.append(ingredient.name)
+        for f in ("quantity",) + NUTRIENT_FIELDS:
+            setattr(self, f, np.append(getattr(self, f), float(getattr(ingredient, f))))
+        self.index[ingredient.name] = len(self.names) - 1
+        return len(self.names) - 1
+    
+    def delete(self, row: int):
+        """Remove a row; later rows shift down by one"""
+        del self.names[row]
+        for f in ("quantity",) + NUTRIENT_FIELDS:
+            setattr(self, f, np.delete(getattr(self, f), row))
+        self.index = {name: i for i, name in enumerate(self.names)}
+    
+    def __getitem__(self, name: str) -> Ingredient:
+        i = self.index[name]
+        return Ingredient(name, float(self.quantity[i]), float(self.calories[i]),
+                          float(self.protein[i]), float(self.carbs[i]), float(self.fat[i]))
+    
+    def column(self, nutrient: str) -> np.ndarray:
+        return getattr(self, nutrient)
+    
+    def nutrient_matrix(self, rows=None) -> np.ndarray:
+        """(n, 4) matrix of per-gram calories, protein, carbs, fat (optionally only `rows`)"""
+        if rows is None:
+            return np.column_stack([self.column(f) for f in NUTRIENT_FIELDS]).reshape(-1, 4)
+        return np.column_stack([self.column(f)[rows] for f in NUTRIENT_FIELDS]).reshape(-1, 4)
+    
+    def nutritional_scores(self, nutrient: str) -> np.ndarray:
+        """Vectorized Ingredient.nutritional_score for every row"""
+        values = self.column(nutrient)
+        scores = np.zeros(len(self))
+        np.divide(values, self.calories, out=scores, where=self.calories > 0)
+        return scores
+    
+    def sorted_order(self, nutrient: str) -> np.ndarray:
+        """Row indices by descending score (stable, like sorted(..., reverse=True))"""
+        return np.argsort(-self.nutritional_scores(nutrient), kind="stable")
+    
+    def greedy_fill(self, max_calories: float, target_nutrient: str,
+                    order: Optional[np.ndarray] = None) -> np.ndarray:
+        """Grams per row from the density-ordered greedy fill up to max_calories
+        
+        Rows that add the target at no calorie cost are always taken in full.
+        """
+        if order is None:
+            order = self.sorted_order(target_nutrient)
+        free = (self.calories <= 0) & (self.column(target_nutrient) > 0) & (self.quantity > 0)
+        order = order[(self.calories[order] > 0) & (self.quantity[order] > 0)]
+        cumulative = np.cumsum(self.quantity[order] * self.calories[order])
+        before = cumulative - self.quantity[order] * self.calories[order]
+        remaining = np.maximum(max_calories - before, 0.0)
+        take = np.minimum(self.quantity[order], remaining / self.calories[order])
+        quantities = np.zeros(len(self))
+        quantities[order] = take
+        quantities[free] = self.quantity[free]
+        return quantities
+    
+    def totals(self, quantities: np.ndarray) -> Dict[str, float]:
+        """Total calories and macros for grams-per-row quantities"""
+        totals = self.nutrient_matrix().T @ quantities if len(self) else np.zeros(4)
+        return {f: float(v) for f, v in zip(NUTRIENT_FIELDS, totals)}
+    
+    def result(self, quantities: np.ndarray, target_nutrient: str,
+               order: Optional[np.ndarray] = None) -> Dict:
+        """Optimization result in the optimize_recipe_portions format
+        
+        Portions are listed in `order` (e.g. the greedy density order) when given.
+        """
+        rows = np.arange(len(self)) if order is None else order
+        used = rows[quantities[rows] > 1e-9]
+        portions = {self.names[i]: float(quantities[i]) for i in used}
+        totals = self.totals(quantities)
+        total_calories = totals["calories"]
+        return {
+            "portions": portions,
+            "total_calories": total_calories,
+            f"total_{target_nutrient}": totals[target_nutrient],
+            "total_protein": totals["protein"],
+            "total_carbs": totals["carbs"],
+            "total_fat": totals["fat"],
+            "macros_breakdown": macros_breakdown(totals)
+        }
+
+def macros_breakdown(totals: Dict[str, float]) -> Dict[str, float]:
+    """Percent of calories from each macro"""
+    total_calories = totals["calories"]
+    return {
+        f"{macro}_percent": (totals[macro] * factor / total_calories * 100) if total_calories > 0 else 0
+        for macro, factor in MACRO_CALORIES.items()
+    }
+
 # ========================
 # Enhanced Fallback Nutrition Database
 # ========================
@@ -62,251 +551,2716 @@ NUTRITION_DB = {
     "egg": {"calories": 1.55, "protein": 0.13, "carbs": 0.011, "fat": 0.11},
     "tofu": {"calories": 0.83, "protein": 0.17, "carbs": 0.019, "fat": 0.048},
     
-    # Carbohydrates
-    "rice": {"calories": 1.3, "protein": 0.028, "carbs": 0.28, "fat": 0.003},
-    "brown rice": {"calories": 1.12, "protein": 0.023, "carbs": 0.23, "fat": 0.009},
-    "pasta": {"calories": 1.31, "protein": 0.05, "carbs": 0.25, "fat": 0.011},
-    "bread": {"calories": 2.65, "protein": 0.09, "carbs": 0.49, "fat": 0.032},
-    "quinoa": {"calories": 1.20, "protein": 0.044, "carbs": 0.22, "fat": 0.019},
-    "oats": {"calories": 3.89, "protein": 0.169, "carbs": 0.661, "fat": 0.069},
-    "potato": {"calories": 0.77, "protein": 0.02, "carbs": 0.17, "fat": 0.001},
-    "sweet potato": {"calories": 0.86, "protein": 0.02, "carbs": 0.20, "fat": 0.001},
+    # Carbohydrates
+    "rice": {"calories": 1.3, "protein": 0.028, "carbs": 0.28, "fat": 0.003},
+    "brown rice": {"calories": 1.12, "protein": 0.023, "carbs": 0.23, "fat": 0.009},
+    "pasta": {"calories": 1.31, "protein": 0.05, "carbs": 0.25, "fat": 0.011},
+    "bread": {"calories": 2.65, "protein": 0.09, "carbs": 0.49, "fat": 0.032},
+    "quinoa": {"calories": 1.20, "protein": 0.044, "carbs": 0.22, "fat": 0.019},
+    "oats": {"calories": 3.89, "protein": 0.169, "carbs": 0.661, "fat": 0.069},
+    "potato": {"calories": 0.77, "protein": 0.02, "carbs": 0.17, "fat": 0.001},
+    "sweet potato": {"calories": 0.86, "protein": 0.02, "carbs": 0.20, "fat": 0.001},
+    
+    # Vegetables
+    "broccoli": {"calories": 0.34, "protein": 0.028, "carbs": 0.07, "fat": 0.004},
+    "spinach": {"calories": 0.23, "protein": 0.029, "carbs": 0.036, "fat": 0.004},
+    "kale": {"calories": 0.43, "protein": 0.029, "carbs": 0.10, "fat": 0.007},
+    "carrots": {"calories": 0.41, "protein": 0.009, "carbs": 0.096, "fat": 0.002},
+    "bell pepper": {"calories": 0.26, "protein": 0.008, "carbs": 0.061, "fat": 0.002},
+    "tomato": {"calories": 0.18, "protein": 0.009, "carbs": 0.039, "fat": 0.002},
+    "onion": {"calories": 0.40, "protein": 0.011, "carbs": 0.093, "fat": 0.001},
+    "garlic": {"calories": 1.49, "protein": 0.064, "carbs": 0.331, "fat": 0.005},
+    
+    # Fruits
+    "banana": {"calories": 0.89, "protein": 0.011, "carbs": 0.23, "fat": 0.003},
+    "apple": {"calories": 0.52, "protein": 0.003, "carbs": 0.14, "fat": 0.002},
+    "orange": {"calories": 0.43, "protein": 0.009, "carbs": 0.087, "fat": 0.001},
+    "berries": {"calories": 0.43, "protein": 0.005, "carbs": 0.096, "fat": 0.003},
+    
+    # Dairy & Others
+    "milk": {"calories": 0.42, "protein": 0.034, "carbs": 0.05, "fat": 0.01},
+    "greek yogurt": {"calories": 0.97, "protein": 0.17, "carbs": 0.061, "fat": 0.052},
+    "cheese": {"calories": 4.02, "protein": 0.25, "carbs": 0.024, "fat": 0.33},
+    "olive oil": {"calories": 8.84, "protein": 0.0, "carbs": 0.0, "fat": 1.0},
+    "avocado": {"calories": 1.67, "protein": 0.020, "carbs": 0.017, "fat": 0.147},
+    "nuts": {"calories": 6.07, "protein": 0.206, "carbs": 0.207, "fat": 0.540}
+}
+
+# ========================
+# Fuzzy Food Name Matching
+# ========================
+def _singular(token: str) -> str:
+    """Cheap plural folding so "eggs"/"potatoes"/"berries" meet their singular forms"""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 4 and token.endswith("oes"):
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+def _food_key(name: str) -> str:
+    return " ".join(_singular(token) for token in name.split())
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class FoodMatcher:
+    """Token + trigram inverted index over food names.
+    
+    Candidates are scored with a blend of trigram Jaccard similarity and
+    whole-token containment (shared tokens over the shorter name, so
+    "whole milk" fully covers "milk" and "yogurt" is covered by "greek
+    yogurt"), counted for every candidate at once with
+    np.bincount over the posting lists, so a lookup stays well under a
+    millisecond even for a USDA-sized table. Only candidates with the same
+    head noun (last token) qualify, so "oat milk" never becomes "oats".
+    """
+    
+    def __init__(self, names, threshold: float = FUZZY_MATCH_THRESHOLD):
+        self.names = list(names)
+        self.threshold = threshold
+        self.exact = {}
+        gram_postings: Dict[str, List[int]] = {}
+        token_postings: Dict[str, List[int]] = {}
+        gram_counts, token_counts, heads = [], [], []
+        self._head_ids: Dict[str, int] = {}
+        for i, name in enumerate(self.names):
+            key = _food_key(name)
+            self.exact.setdefault(key, i)
+            head = key.rsplit(" ", 1)[-1]
+            heads.append(self._head_ids.setdefault(head, len(self._head_ids)))
+            grams = _trigrams(key)
+            tokens = set(key.split())
+            gram_counts.append(len(grams))
+            token_counts.append(len(tokens))
+            for gram in grams:
+                gram_postings.setdefault(gram, []).append(i)
+            for token in tokens:
+                token_postings.setdefault(token, []).append(i)
+        self.gram_counts = np.array(gram_counts, dtype=np.int32)
+        self.token_counts = np.array(token_counts, dtype=np.int32)
+        self.heads = np.array(heads, dtype=np.int32)
+        self.gram_index = {g: np.array(ids, dtype=np.int32) for g, ids in gram_postings.items()}
+        self.token_index = {t: np.array(ids, dtype=np.int32) for t, ids in token_postings.items()}
+    
+    def __len__(self) -> int:
+        return len(self.names)
+    
+    def match(self, query: str):
+        """Return (name, confidence) for the best match above threshold, else None"""
+        key = _food_key(query)
+        if key in self.exact:
+            return self.names[self.exact[key]], 1.0
+        n = len(self.names)
+        head = self._head_ids.get(key.rsplit(" ", 1)[-1])
+        grams = _trigrams(key)
+        postings = [self.gram_index[g] for g in grams if g in self.gram_index]
+        if not n or not postings or head is None:
+            return None
+        shared_grams = np.bincount(np.concatenate(postings), minlength=n)
+        candidates = np.flatnonzero((shared_grams > 0) & (self.heads == head))
+        if not len(candidates):
+            return None
+        shared = shared_grams[candidates]
+        jaccard = shared / (len(grams) + self.gram_counts[candidates] - shared)
+        
+        tokens = set(key.split())
+        token_postings = [self.token_index[t] for t in tokens if t in self.token_index]
+        if token_postings:
+            shared_tokens = np.bincount(np.concatenate(token_postings), minlength=n)[candidates]
+            overlap = shared_tokens / np.minimum(len(tokens), self.token_counts[candidates])
+        else:
+            overlap = np.zeros(len(candidates))
+        
+        scores = 0.5 * jaccard + 0.5 * overlap
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        return self.names[candidates[best]], float(scores[best])
+
+_food_matcher = None
+
+def get_food_matcher() -> FoodMatcher:
+    """Matcher over NUTRITION_DB, rebuilt if the database has changed size"""
+    global _food_matcher
+    if _food_matcher is None or len(_food_matcher) != len(NUTRITION_DB):
+        _food_matcher = FoodMatcher(NUTRITION_DB.keys())
+    return _food_matcher
+
+# ========================
+# Persistent Nutrition Cache
+# ========================
+class NutritionCache:
+    """SQLite-backed cache of API nutrition lookups keyed on the cleaned food name.
+    
+    Entries expire after a TTL, the table is bounded with LRU eviction, and
+    "no data found" answers are cached as negative entries so unknown foods
+    don't hit the API over and over. The file runs in WAL mode so several
+    processes can share it; write failures are counted, never raised.
+    """
+    
+    def __init__(self, path: Optional[str] = CACHE_PATH, ttl: float = CACHE_TTL_SECONDS,
+                 negative_ttl: float = CACHE_NEGATIVE_TTL_SECONDS,
+                 max_entries: int = CACHE_MAX_ENTRIES):
+        self.path = path or ":memory:"
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.evictions = 0
+        self.write_errors = 0
+        self._lock = threading.Lock()
+        try:
+            self._conn = self._connect()
+            self._create_table()
+        except sqlite3.Error:
+            # Unwritable location - keep working with a process-local cache
+            self.path = ":memory:"
+            self._conn = self._connect()
+            self._create_table()
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=CACHE_BUSY_TIMEOUT_SECONDS,
+                               check_same_thread=False)
+        conn.execute(f"PRAGMA busy_timeout = {int(CACHE_BUSY_TIMEOUT_SECONDS * 1000)}")
+        if self.path != ":memory:":
+            # Readers don't block the writer (and vice versa) across processes
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+    
+    def _write(self, sql: str, params: tuple = (), evict: bool = False) -> bool:
+        """Run and commit one best-effort write; the caller holds the lock"""
+        try:
+            self._conn.execute(sql, params)
+            if evict:
+                self._evict()
+            self._conn.commit()
+            return True
+        except sqlite3.Error:
+            # e.g. "database is locked" past the busy timeout; the cache is only an optimization
+            self._conn.rollback()
+            self.write_errors += 1
+            return False
+    
+    def _create_table(self):
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != CACHE_SCHEMA_VERSION:
+            # Older caches hold values in another unit (v1 was per 100 g)
+            self._conn.execute("DROP TABLE IF EXISTS nutrition")
+            self._conn.execute(f"PRAGMA user_version = {CACHE_SCHEMA_VERSION}")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS nutrition (
+                name TEXT PRIMARY KEY,
+                data TEXT,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            )""")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS nutrition_last_access ON nutrition(last_access)")
+        self._conn.commit()
+    
+    def get(self, name: str):
+        """Return (hit, nutrition); a hit with nutrition None is a cached negative answer"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, created, last_access FROM nutrition WHERE name = ?",
+                (name,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return False, None
+            data, created, last_access = row
+            ttl = self.ttl if data is not None else self.negative_ttl
+            if now - created > ttl:
+                # Expired answers are kept (until replaced or evicted) for get_stale
+                if data is None:
+                    self._write("DELETE FROM nutrition WHERE name = ?", (name,))
+                self.misses += 1
+                return False, None
+            if now - last_access > CACHE_ACCESS_RESOLUTION_SECONDS:
+                # Coarse LRU timestamps keep most hits read-only
+                self._write("UPDATE nutrition SET last_access = ? WHERE name = ?", (now, name))
+            self.hits += 1
+            if data is None:
+                self.negative_hits += 1
+                return True, None
+            return True, json.loads(data)
+    
+    def get_stale(self, name: str) -> Optional[Dict[str, float]]:
+        """Last known nutrition regardless of age (fallback while the API is down)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM nutrition WHERE name = ? AND data IS NOT NULL", (name,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+    
+    def put(self, name: str, nutrition: Optional[Dict[str, float]]):
+        """Store a lookup result; pass None to record a negative answer"""
+        now = time.time()
+        data = json.dumps(nutrition) if nutrition is not None else None
+        with self._lock:
+            self._write("INSERT OR REPLACE INTO nutrition (name, data, created, last_access) "
+                        "VALUES (?, ?, ?, ?)", (name, data, now, now), evict=True)
+    
+    def _evict(self):
+        """Drop least recently used entries beyond max_entries"""
+        count = self._conn.execute("SELECT COUNT(*) FROM nutrition").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM nutrition WHERE name IN "
+                "(SELECT name FROM nutrition ORDER BY last_access ASC LIMIT ?)", (excess,))
+            self.evictions += excess
+    
+    def clear(self):
+        """Remove every cached entry"""
+        with self._lock:
+            self._conn.execute("DELETE FROM nutrition")
+            self._conn.commit()
+    
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM nutrition").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "negative_hits": self.negative_hits,
+            "evictions": self.evictions,
+            "write_errors": self.write_errors,
+            "entries": size,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+_nutrition_cache = None
+
+def get_nutrition_cache() -> NutritionCache:
+    """Return the shared nutrition cache, opening it on first use"""
+    global _nutrition_cache
+    if _nutrition_cache is None:
+        _nutrition_cache = NutritionCache()
+    return _nutrition_cache
+
+# ========================
+# Recipe Ranking Engine
+# ========================
+_TOKEN_PATTERN = re.compile(r"[a-z]+")
+
+def recipe_tokens(text: str) -> List[str]:
+    """Lowercase word tokens with plural folding, as used by the recipe index"""
+    return [_singular(token) for token in _TOKEN_PATTERN.findall(text.lower())]
+
+class RecipeIndex:
+    """BM25 inverted index over the ingredient field of recipes.
+    
+    Each recipe is tokenized once when added; queries score only the
+    postings of their own terms and take the top-k with a heap. Recipes
+    are deduplicated on title plus ingredient list, so different recipes
+    sharing a title are both kept.
+    """
+    
+    K1 = 1.2
+    B = 0.75
+    
+    def __init__(self, recipes: List[Recipe] = ()):
+        self.recipes: List[Recipe] = []
+        self._seen = set()
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._lengths: List[int] = []
+        self._arrays = None   # token -> (doc ids, term frequencies), built lazily
+        for recipe in recipes:
+            self.add(recipe)
+    
+    def __len__(self) -> int:
+        return len(self.recipes)
+    
+    def add(self, recipe: Recipe) -> bool:
+        """Index a recipe; returns False if it duplicates one already indexed"""
+        key = (" ".join(recipe.title.lower().split()), " ".join(recipe_tokens(recipe.ingredients)))
+        if key in self._seen:
+            return False
+        self._seen.add(key)
+        doc = len(self.recipes)
+        self.recipes.append(recipe)
+        tokens = recipe_tokens(recipe.ingredients)
+        self._lengths.append(len(tokens))
+        for token in tokens:
+            postings = self._postings.setdefault(token, {})
+            postings[doc] = postings.get(doc, 0) + 1
+        self._arrays = None
+        return True
+    
+    def _posting_arrays(self):
+        if self._arrays is None:
+            self._arrays = {token: (np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                                    np.fromiter(postings.values(), dtype=np.float64, count=len(postings)))
+                            for token, postings in self._postings.items()}
+            self._doc_lengths = np.array(self._lengths, dtype=np.float64)
+            self._avg_length = float(self._doc_lengths.mean()) if len(self._lengths) else 0.0
+        return self._arrays
+    
+    def scores(self, ingredient_list: List[str]) -> np.ndarray:
+        """BM25 score of every indexed recipe for the user's ingredients"""
+        arrays = self._posting_arrays()
+        n = len(self.recipes)
+        scores = np.zeros(n)
+        if not n:
+            return scores
+        avg_length = self._avg_length or 1.0
+        for ingredient in normalize_many(ingredient_list):
+            for token in set(recipe_tokens(ingredient)):
+                if token not in arrays:
+                    continue
+                docs, tf = arrays[token]
+                idf = np.log(1.0 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                norm = self.K1 * (1 - self.B + self.B * self._doc_lengths[docs] / avg_length)
+                scores[docs] += idf * tf * (self.K1 + 1) / (tf + norm)
+        return scores
+    
+    def search(self, ingredient_list: List[str], k: int = 5) -> List[Recipe]:
+        """Top-k recipes for the ingredients; nutrition_score holds the BM25 score"""
+        scores = self.scores(ingredient_list)
+        candidates = np.flatnonzero(scores).tolist()
+        top = heapq.nlargest(k, candidates, key=scores.__getitem__)
+        if len(top) < k:
+            # like the old ranking, fall back to unmatched recipes in fetch order
+            top += np.flatnonzero(scores == 0)[:k - len(top)].tolist()
+        results = []
+        for doc in top:
+            recipe = replace(self.recipes[doc], nutrition_score=float(scores[doc]))
+            results.append(recipe)
+        return results
+
+# ========================
+# Local Recipe Corpus
+# ========================
+RECIPE_STORE_MAGIC = b"NMRCP001"
+
+def _read_recipe_source(path: str):
+    """Yield Recipe objects from a JSONL or CSV export (API Ninjas field names)"""
+    def to_recipe(row: Dict) -> Recipe:
+        ingredients = row.get("ingredients", "")
+        if isinstance(ingredients, list):
+            ingredients = "|".join(ingredients)
+        return Recipe(title=row.get("title") or "Unknown Recipe",
+                      ingredients=ingredients or "",
+                      instructions=row.get("instructions") or "",
+                      servings=row.get("servings") or "Unknown servings")
+    
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            for row in csv.DictReader(f):
+                yield to_recipe(row)
+        else:
+            for line in f:
+                if line.strip():
+                    yield to_recipe(json.loads(line))
+
+def build_recipe_store(source_path: str, store_path: str = LOCAL_RECIPE_STORE_PATH) -> int:
+    """Compile a JSONL/CSV recipe export into the memory-mappable store format.
+    
+    Layout: magic, header length, JSON header with section offsets, then
+    8-byte aligned sections: record offsets (uint64), records (UTF-8 JSON
+    arrays), and the BM25 postings (vocabulary, doc ids, term frequencies,
+    document lengths). Returns the number of recipes stored.
+    """
+    index = RecipeIndex()
+    for recipe in _read_recipe_source(source_path):
+        index.add(recipe)
+    
+    records = [json.dumps([r.title, r.ingredients, r.instructions, r.servings]).encode("utf-8")
+               for r in index.recipes]
+    offsets = np.zeros(len(records) + 1, dtype=np.uint64)
+    offsets[1:] = np.cumsum([len(r) for r in records])
+    
+    vocab, doc_ids, term_freqs = {}, [], []
+    position = 0
+    for token, postings in sorted(index._postings.items()):
+        vocab[token] = [position, len(postings)]
+        doc_ids.extend(postings.keys())
+        term_freqs.extend(postings.values())
+        position += len(postings)
+    
+    sections = [
+        ("offsets", offsets.tobytes()),
+        ("records", b"".join(records)),
+        ("doc_ids", np.array(doc_ids, dtype=np.int32).tobytes()),
+        ("term_freqs", np.array(term_freqs, dtype=np.float32).tobytes()),
+        ("lengths", np.array(index._lengths, dtype=np.float32).tobytes()),
+        ("vocab", json.dumps(vocab).encode("utf-8")),
+    ]
+    header = {"count": len(records), "sections": {}}
+    # offsets are relative to the end of the header block, so compute sizes first
+    start = 0
+    for name, data in sections:
+        header["sections"][name] = [start, len(data)]
+        start += len(data) + (-len(data) % 8)
+    header_bytes = json.dumps(header).encode("utf-8")
+    header_bytes += b" " * (-(len(header_bytes) + 12) % 8)
+    
+    with open(store_path, "wb") as f:
+        f.write(RECIPE_STORE_MAGIC)
+        f.write(len(header_bytes).to_bytes(4, "little"))
+        f.write(header_bytes)
+        for _, data in sections:
+            f.write(data)
+            f.write(b"\0" * (-len(data) % 8))
+    return len(records)
+
+class _StoredRecipes:
+    """Read-only sequence of Recipe objects decoded on demand from the mapped file"""
+    
+    def __init__(self, buffer, base: int, offsets: np.ndarray, records_start: int):
+        self._buffer = buffer
+        self._offsets = offsets
+        self._start = base + records_start
+    
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+    
+    def __getitem__(self, i: int) -> Recipe:
+        begin = self._start + int(self._offsets[i])
+        end = self._start + int(self._offsets[i + 1])
+        title, ingredients, instructions, servings = json.loads(self._buffer[begin:end])
+        return Recipe(title, ingredients, instructions, servings)
+
+class LocalRecipeStore(RecipeIndex):
+    """Memory-mapped offline recipe corpus searchable like a RecipeIndex.
+    
+    Opening only maps the file and reads the header; posting lists are
+    zero-copy views into the mapping and recipes are decoded only when a
+    search returns them.
+    """
+    
+    def __init__(self, path: str = LOCAL_RECIPE_STORE_PATH):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:8] != RECIPE_STORE_MAGIC:
+            raise ValueError(f"Not a recipe store: {path}")
+        header_length = int.from_bytes(self._mmap[8:12], "little")
+        self._header = json.loads(self._mmap[12:12 + header_length])
+        self._base = 12 + header_length
+        self._arrays = None
+        offsets = self._section_array("offsets", np.uint64)
+        self.recipes = _StoredRecipes(self._mmap, self._base, offsets,
+                                      self._header["sections"]["records"][0])
+    
+    def _section_array(self, name: str, dtype) -> np.ndarray:
+        start, length = self._header["sections"][name]
+        return np.frombuffer(self._mmap, dtype=dtype, count=length // np.dtype(dtype).itemsize,
+                             offset=self._base + start)
+    
+    def add(self, recipe: Recipe) -> bool:
+        raise TypeError("LocalRecipeStore is read-only; rebuild it with build_recipe_store")
+    
+    def _posting_arrays(self):
+        if self._arrays is None:
+            start, length = self._header["sections"]["vocab"]
+            vocab = json.loads(self._mmap[self._base + start:self._base + start + length])
+            doc_ids = self._section_array("doc_ids", np.int32)
+            term_freqs = self._section_array("term_freqs", np.float32)
+            self._arrays = {token: (doc_ids[begin:begin + count], term_freqs[begin:begin + count])
+                            for token, (begin, count) in vocab.items()}
+            self._doc_lengths = self._section_array("lengths", np.float32)
+            self._avg_length = float(self._doc_lengths.mean()) if len(self._doc_lengths) else 0.0
+        return self._arrays
+
+_local_recipe_store = None
+
+def get_local_recipe_store() -> Optional[LocalRecipeStore]:
+    """Open the offline recipe store on first use; None if it hasn't been built"""
+    global _local_recipe_store
+    if _local_recipe_store is None and os.path.exists(LOCAL_RECIPE_STORE_PATH):
+        try:
+            _local_recipe_store = LocalRecipeStore(LOCAL_RECIPE_STORE_PATH)
+        except (OSError, ValueError):
+            return None
+    return _local_recipe_store
+
+# ========================
+# Local Food Database
+# ========================
+FOOD_DB_MAGIC = b"NMFOOD01"
+FOOD_DB_NUTRIENTS = ("calories", "protein", "carbs", "fat")
+
+def _food_hash(key: str) -> int:
+    """Stable 64-bit hash (Python's str hash is salted per process)"""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+def _read_food_source(path: str, skipped: Optional[List] = None):
+    """Yield (name, per-gram nutrition) from a CSV or JSONL food table.
+    
+    Rows use API Ninjas field names (name, calories, protein_g,
+    carbohydrates_total_g, fat_total_g, serving_size_g defaulting to 100 g).
+    Blank nutrient cells count as 0; rows with no nutrient values at all,
+    unparseable numbers or a non-positive serving size are left out and
+    reported as (line number, reason) in ``skipped``.
+    """
+    nutrient_keys = ("calories", "protein_g", "carbohydrates_total_g", "fat_total_g")
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            reader = csv.DictReader(f)
+            rows = ((reader.line_num, row) for row in reader)
+        else:
+            rows = ((line_no, json.loads(line)) for line_no, line in enumerate(f, 1)
+                    if line.strip())
+        for line_no, row in rows:
+            name = _normalize_food_name(str(row.get("name") or ""))
+            if not name:
+                continue
+            try:
+                if all(str(row.get(key) or "").strip() == "" for key in nutrient_keys):
+                    raise ValueError("no nutrient values")
+                nutrition = nutrition_from_item(row)
+            except ValueError as e:
+                if skipped is not None:
+                    skipped.append((line_no, f"{name}: {e}"))
+                continue
+            yield name, nutrition
+
+def build_food_db(source_path: str, db_path: str = LOCAL_FOOD_DB_PATH,
+                  skipped: Optional[List] = None) -> int:
+    """Compile a CSV/JSONL food table into the memory-mappable food database.
+    
+    Layout mirrors the recipe store: magic, header length, JSON header with
+    section offsets, then 8-byte aligned sections: one float32 column per
+    nutrient (per gram), name offsets (uint32) into a UTF-8 string table,
+    per-row name hashes (uint64) and an open-addressing slot table (int32
+    row ids, -1 empty, linear probing, at most half full). Later duplicates
+    of a name are dropped, and invalid rows are collected in ``skipped``
+    (see _read_food_source). Returns the number of foods stored.
+    """
+    names, hashes, rows = [], [], {}
+    columns = {nutrient: [] for nutrient in FOOD_DB_NUTRIENTS}
+    for name, nutrition in _read_food_source(source_path, skipped):
+        key = _food_key(name)
+        if key in rows:
+            continue
+        rows[key] = len(names)
+        names.append(name.encode("utf-8"))
+        hashes.append(_food_hash(key))
+        for nutrient in FOOD_DB_NUTRIENTS:
+            columns[nutrient].append(nutrition[nutrient])
+    
+    slot_count = 1 << max(3, (2 * len(names) - 1).bit_length())
+    mask = slot_count - 1
+    slots = [-1] * slot_count
+    for row, h in enumerate(hashes):
+        slot = h & mask
+        while slots[slot] != -1:
+            slot = (slot + 1) & mask
+        slots[slot] = row
+    
+    name_offsets = np.zeros(len(names) + 1, dtype=np.uint32)
+    name_offsets[1:] = np.cumsum([len(name) for name in names])
+    sections = [(nutrient, np.array(columns[nutrient], dtype=np.float32).tobytes())
+                for nutrient in FOOD_DB_NUTRIENTS]
+    sections += [
+        ("name_offsets", name_offsets.tobytes()),
+        ("names", b"".join(names)),
+        ("hashes", np.array(hashes, dtype=np.uint64).tobytes()),
+        ("slots", np.array(slots, dtype=np.int32).tobytes()),
+    ]
+    header = {"count": len(names), "sections": {}}
+    start = 0
+    for name, data in sections:
+        header["sections"][name] = [start, len(data)]
+        start += len(data) + (-len(data) % 8)
+    header_bytes = json.dumps(header).encode("utf-8")
+    header_bytes += b" " * (-(len(header_bytes) + 12) % 8)
+    
+    with open(db_path, "wb") as f:
+        f.write(FOOD_DB_MAGIC)
+        f.write(len(header_bytes).to_bytes(4, "little"))
+        f.write(header_bytes)
+        for _, data in sections:
+            f.write(data)
+            f.write(b"\0" * (-len(data) % 8))
+    return len(names)
+
+class FoodDatabase:
+    """Read-only, memory-mapped food table with exact (plural-folded) name lookup.
+    
+    Opening maps the file and parses a small header, whatever the row
+    count; a lookup hashes the name and touches one slot, one hash, one
+    name and four column pages. The mapping is backed by the page cache,
+    so every process that opens the file shares the same physical pages.
+    """
+    
+    def __init__(self, path: str = LOCAL_FOOD_DB_PATH):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:8] != FOOD_DB_MAGIC:
+            raise ValueError(f"Not a food database: {path}")
+        header_length = int.from_bytes(self._mmap[8:12], "little")
+        self._header = json.loads(self._mmap[12:12 + header_length])
+        self._base = 12 + header_length
+        self.columns = {nutrient: self._section_array(nutrient, np.float32)
+                        for nutrient in FOOD_DB_NUTRIENTS}
+        self._name_offsets = self._section_array("name_offsets", np.uint32)
+        self._names_start = self._base + self._header["sections"]["names"][0]
+        self._hashes = self._section_array("hashes", np.uint64)
+        self._slots = self._section_array("slots", np.int32)
+        self._mask = len(self._slots) - 1
+    
+    def _section_array(self, name: str, dtype) -> np.ndarray:
+        start, length = self._header["sections"][name]
+        return np.frombuffer(self._mmap, dtype=dtype, count=length // np.dtype(dtype).itemsize,
+                             offset=self._base + start)
+    
+    def __len__(self) -> int:
+        return self._header["count"]
+    
+    def name(self, row: int) -> str:
+        begin = self._names_start + int(self._name_offsets[row])
+        end = self._names_start + int(self._name_offsets[row + 1])
+        return self._mmap[begin:end].decode("utf-8")
+    
+    def find(self, food_name: str) -> int:
+        """Row index for a cleaned food name, or -1"""
+        key = _food_key(food_name)
+        h = _food_hash(key)
+        slot = h & self._mask
+        while True:
+            row = int(self._slots[slot])
+            if row < 0:
+                return -1
+            if int(self._hashes[row]) == h and _food_key(self.name(row)) == key:
+                return row
+            slot = (slot + 1) & self._mask
+    
+    def get(self, food_name: str) -> Optional[Dict[str, float]]:
+        """Per-gram nutrition for a cleaned food name, or None"""
+        row = self.find(food_name)
+        if row < 0:
+            return None
+        return {nutrient: float(column[row]) for nutrient, column in self.columns.items()}
+    
+    def __contains__(self, food_name: str) -> bool:
+        return self.find(food_name) >= 0
+
+_food_db = None
+
+def get_food_db() -> Optional[FoodDatabase]:
+    """Open the local food database on first use; None if it hasn't been built"""
+    global _food_db
+    if _food_db is None and os.path.exists(LOCAL_FOOD_DB_PATH):
+        try:
+            _food_db = FoodDatabase(LOCAL_FOOD_DB_PATH)
+        except (OSError, ValueError):
+            return None
+    return _food_db
+
+# ========================
+# Enhanced API Functions
+# ========================
+class TokenBucket:
+    """Thread-safe token bucket rate limiter"""
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate            # tokens added per second
+        self.capacity = capacity    # maximum burst size
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+    
+    def acquire(self, tokens: float = 1.0):
+        """Block until the requested number of tokens is available"""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+class APIUnavailableError(ConnectionError):
+    """The API could not answer (transport failure, retries exhausted, open circuit, deadline)"""
+
+class CircuitOpenError(APIUnavailableError):
+    """Raised without calling the API while its circuit breaker is open"""
+
+class DeadlineExceeded(APIUnavailableError):
+    """The request's deadline budget ran out"""
+
+class NutritionNotFound(ValueError):
+    """The API (or a cached answer from it) has no data for the food"""
+
+class NutritionAPIError(ValueError):
+    """The nutrition lookup failed upstream; retryable when the API was unavailable"""
+    
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker: closed -> open -> half-open (one probe) -> closed"""
+    
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_until = 0.0
+        self._probing = False
+        self._probe_thread = None
+        self._lock = threading.Lock()
+    
+    @property
+    def state(self) -> str:
+        if time.monotonic() < self.opened_until:
+            return "open"
+        return "half_open" if self.failures >= self.failure_threshold else "closed"
+    
+    def allow(self) -> bool:
+        """Whether a call may go out now (only one probe at a time while half-open)"""
+        with self._lock:
+            if time.monotonic() < self.opened_until:
+                return False
+            if self.failures >= self.failure_threshold:
+                if self._probing:
+                    return False
+                self._probing = True
+                self._probe_thread = threading.get_ident()
+            return True
+    
+    def release_probe(self):
+        """Give back a half-open probe this thread took without recording an outcome"""
+        with self._lock:
+            if self._probing and self._probe_thread == threading.get_ident():
+                self._probing = False
+    
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_until = 0.0
+            self._probing = False
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.failures >= self.failure_threshold:
+                self.opened_until = time.monotonic() + self.reset_timeout
+    
+    def trip(self, seconds: float):
+        """Open the circuit for a server-specified time (a long Retry-After)"""
+        with self._lock:
+            self.failures = max(self.failures, self.failure_threshold)
+            self.opened_until = time.monotonic() + seconds
+            self._probing = False
+
+class Deadline:
+    """Absolute time budget shared by every API call made under it"""
+    
+    def __init__(self, seconds: float):
+        self.expires = time.monotonic() + seconds
+    
+    def remaining(self) -> float:
+        return max(0.0, self.expires - time.monotonic())
+
+_current_deadline: contextvars.ContextVar = contextvars.ContextVar("api_deadline", default=None)
+
+@contextmanager
+def deadline_budget(seconds: Optional[float]):
+    """Bound every API call in the block (and in jobs it submits) by one deadline.
+    
+    Nested budgets never extend an outer one; None keeps the current deadline.
+    """
+    current = _current_deadline.get()
+    if seconds is None:
+        yield current
+        return
+    deadline = Deadline(seconds)
+    if current is not None and current.expires < deadline.expires:
+        deadline = current
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+def retry_after_seconds(response) -> Optional[float]:
+    """Parse a Retry-After header (delta seconds or HTTP date)"""
+    import email.utils
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff; a Retry-After hint sets the minimum wait"""
+    delay = random.uniform(0, min(API_BACKOFF_MAX, API_BACKOFF_BASE * 2 ** attempt))
+    if retry_after is not None:
+        delay = retry_after + random.uniform(0, API_BACKOFF_BASE)
+    return delay
+
+class APIClient:
+    """Shared HTTP client: pooled keep-alive session, rate limiter, worker pool,
+    retries with backoff and a circuit breaker per endpoint"""
+    
+    def __init__(self, pool_size: int = HTTP_POOL_SIZE, max_workers: int = HTTP_MAX_WORKERS,
+                 limiter: Optional[TokenBucket] = None):
+        self.limiter = limiter or TokenBucket(1.0 / MIN_REQUEST_INTERVAL, RATE_LIMIT_BURST)
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size,
+                                                pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix="api-client")
+        self.breakers: Dict[str, CircuitBreaker] = {}
+    
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        return self.breakers.setdefault(endpoint, CircuitBreaker())
+    
+    def get(self, url: str, params: Dict, timeout: float = 15):
+        """Rate-limited GET through the pooled session.
+        
+        Timeouts, connection errors, 429 and 5xx answers are retried with
+        jittered exponential backoff (honouring Retry-After) within the
+        current deadline budget. While the endpoint's circuit is open the
+        call fails fast with CircuitOpenError. Once retries run out, a
+        retryable response is returned as-is and a transport failure
+        raises APIUnavailableError.
+        """
+        endpoint = API_ENDPOINTS.get(url, url)
+        breaker = self.breaker(endpoint)
+        deadline = _current_deadline.get()
+        for attempt in range(API_MAX_RETRIES + 1):
+            request_timeout = timeout
+            if deadline is not None:
+                request_timeout = min(timeout, deadline.remaining())
+                if request_timeout <= 0:
+                    METRICS.inc("deadline_exceeded_total", endpoint=endpoint)
+                    raise DeadlineExceeded(f"{endpoint} API deadline exceeded")
+            if not breaker.allow():
+                METRICS.inc("api_circuit_open_total", endpoint=endpoint)
+                raise CircuitOpenError(f"{endpoint} API unavailable (circuit open)")
+            
+            # A half-open probe must be handed back on any exit that doesn't
+            # record an outcome, or the endpoint stays blocked for good
+            try:
+                with METRICS.span("api.rate_limit_wait"):
+                    self.limiter.acquire()
+                start = time.perf_counter()
+                try:
+                    response = self.session.get(url, headers=HEADERS, params=params,
+                                                timeout=request_timeout)
+                except requests.RequestException as e:
+                    METRICS.inc("api_errors_total", endpoint=endpoint)
+                    breaker.record_failure()
+                    response, error, retry_after = None, e, None
+                else:
+                    METRICS.observe("api_request_seconds", time.perf_counter() - start,
+                                    endpoint=endpoint)
+                    METRICS.inc("api_requests_total", endpoint=endpoint,
+                                status=str(response.status_code))
+                    if response.status_code not in API_RETRY_STATUSES:
+                        breaker.record_success()
+                        return response
+                    if response.status_code == 429:
+                        METRICS.inc("api_rate_limited_total", endpoint=endpoint)
+                    breaker.record_failure()
+                    error, retry_after = None, retry_after_seconds(response)
+                    if retry_after is not None and retry_after > API_BACKOFF_MAX:
+                        # Quota window far away: stop calling until it reopens
+                        breaker.trip(retry_after)
+                        break
+            finally:
+                breaker.release_probe()
+            
+            if attempt == API_MAX_RETRIES:
+                break
+            delay = backoff_delay(attempt, retry_after)
+            if deadline is not None and delay >= deadline.remaining():
+                break
+            METRICS.inc("api_retries_total", endpoint=endpoint)
+            time.sleep(delay)
+        
+        if response is None:
+            raise APIUnavailableError(f"{endpoint} API request failed: {error}") from error
+        return response
+    
+    def submit(self, func, *args):
+        """Run func on the worker pool, carrying over the caller's deadline budget"""
+        return self.executor.submit(contextvars.copy_context().run, func, *args)
+    
+    def map(self, func, items) -> List:
+        """Run func over items concurrently, returning results in input order.
+        
+        Failed calls yield the exception object instead of a result.
+        """
+        context = contextvars.copy_context()
+        
+        def call(item):
+            try:
+                return context.copy().run(func, item)
+            except Exception as e:
+                return e
+        
+        return list(self.executor.map(call, items))
+
+_api_client = None
+_api_client_lock = threading.Lock()
+
+def get_api_client() -> APIClient:
+    """Return the process-wide API client, creating it on first use"""
+    global _api_client
+    with _api_client_lock:
+        if _api_client is None:
+            _api_client = APIClient()
+        return _api_client
+
+def rate_limit():
+    """Simple rate limiting to avoid API abuse"""
+    get_api_client().limiter.acquire()
+
+def test_api_connection():
+    """Test if API Ninjas is working"""
+    if not API_NINJAS_KEY or API_NINJAS_KEY == "your_api_key_here":
+        return False, "API key not set"
+    
+    try:
+        response = get_api_client().get(NUTRITION_API_URL,
+                                        params={"query": "apple"},
+                                        timeout=10)
+        
+        if response.status_code == 200:
+            data = response.json()
+            if data:
+                return True, "API working"
+            else:
+                return True, "API working (empty response)"
+        elif response.status_code == 401:
+            return False, "Invalid API key - check your key"
+        elif response.status_code == 429:
+            return False, "Rate limit exceeded - try again later"
+        elif response.status_code == 400:
+            return False, f"Bad request - API key format issue"
+        else:
+            return False, f"API error {response.status_code}"
+    except Exception as e:
+        return False, f"Connection error: {e}"
+
+def _api_key_fingerprint() -> str:
+    return hashlib.sha256(API_NINJAS_KEY.encode("utf-8")).hexdigest()[:16]
+
+def cached_api_health(max_age: float = API_HEALTH_TTL_SECONDS):
+    """Last probe result (working, status) if younger than max_age and for the same key, else None"""
+    try:
+        with open(API_HEALTH_PATH, encoding="utf-8") as f:
+            entry = json.load(f)
+        age = time.time() - float(entry["checked"])
+        # A timestamp from the future (clock change, hand-edited file) isn't fresh
+        if entry["key"] == _api_key_fingerprint() and 0 <= age < max_age:
+            return bool(entry["working"]), str(entry["status"])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+def probe_api_health():
+    """test_api_connection, with the answer written to the on-disk health cache"""
+    working, status = test_api_connection()
+    try:
+        with open(API_HEALTH_PATH, "w", encoding="utf-8") as f:
+            json.dump({"key": _api_key_fingerprint(), "checked": time.time(),
+                       "working": working, "status": status}, f)
+    except OSError:
+        pass
+    return working, status
+
+def start_health_probe(callback=None) -> threading.Thread:
+    """Probe the API on a daemon thread (never delays startup or exit); callback gets the result"""
+    def run():
+        outcome = probe_api_health()
+        if callback is not None:
+            callback(outcome)
+    
+    thread = threading.Thread(target=run, daemon=True, name="api-health-probe")
+    thread.start()
+    return thread
+
+COOKING_TERMS = ('cooked', 'raw', 'fresh', 'frozen', 'canned', 'dried')
+# Cooking terms and "<number><unit>" amounts, removed in a single pass
+_CLEAN_PATTERN = re.compile(
+    r'\b(?:' + '|'.join(COOKING_TERMS) + r')\b'
+    r'|\b\d+\s*(?:g|kg|oz|lb|pounds?|grams?)\b')
+
+def _normalize_food_name(food_name: str) -> str:
+    return ' '.join(_CLEAN_PATTERN.sub('', food_name.lower()).split())
+
+@lru_cache(maxsize=CLEAN_NAME_CACHE_SIZE)
+def clean_food_name(food_name: str) -> str:
+    """Clean and normalize food name for better API results"""
+    return _normalize_food_name(food_name)
+
+def normalize_many(food_names: List[str]) -> List[str]:
+    """Bulk clean_food_name for imports: each distinct name is normalized once,
+    without churning the shared memo cache"""
+    seen: Dict[str, str] = {}
+    for name in food_names:
+        if name not in seen:
+            seen[name] = _normalize_food_name(name)
+    return [seen[name] for name in food_names]
+
+def lookup_nutrition_local(cleaned_name: str):
+    """Resolve a cleaned name without the network: fallback database, local
+    food database, a confident fuzzy match against the fallback database,
+    then cache. Weaker fuzzy matches are left to fuzzy_fallback.
+    
+    Returns (hit, nutrition) like NutritionCache.get; a hit with nutrition
+    None is a cached "no data found" answer.
+    """
+    if cleaned_name in NUTRITION_DB:
+        METRICS.inc("nutrition_lookups_total", source="db")
+        return True, NUTRITION_DB[cleaned_name]
+    
+    food_db = get_food_db()
+    if food_db is not None:
+        nutrition = food_db.get(cleaned_name)
+        if nutrition is not None:
+            METRICS.inc("nutrition_lookups_total", source="food_db")
+            return True, nutrition
+    
+    match = get_food_matcher().match(cleaned_name)
+    if match is not None and match[1] >= FUZZY_CONFIDENT_THRESHOLD:
+        METRICS.inc("nutrition_lookups_total", source="fuzzy")
+        return True, NUTRITION_DB[match[0]]
+    
+    hit, nutrition = get_nutrition_cache().get(cleaned_name)
+    source = ("cache" if nutrition is not None else "negative_cache") if hit else "miss"
+    METRICS.inc("nutrition_lookups_total", source=source)
+    return hit, nutrition
+
+def fuzzy_fallback(cleaned_name: str) -> Optional[Dict[str, float]]:
+    """Nutrition of the best fuzzy match at any qualifying confidence, for when
+    the API can't answer; None if nothing matches"""
+    match = get_food_matcher().match(cleaned_name)
+    if match is None:
+        return None
+    METRICS.inc("nutrition_lookups_total", source="fuzzy_fallback")
+    return NUTRITION_DB[match[0]]
+
+def nutrition_from_item(item: Dict) -> Dict[str, float]:
+    """Per-gram nutrition from one API Ninjas result item (missing or blank values count as 0)"""
+    serving = float(item.get("serving_size_g") or 100.0)
+    if serving <= 0:
+        raise ValueError(f"serving_size_g must be positive, got {serving:g}")
+    return {
+        "calories": float(item.get("calories") or 0) / serving,
+        "protein": float(item.get("protein_g") or 0) / serving,
+        "carbs": float(item.get("carbohydrates_total_g") or 0) / serving,
+        "fat": float(item.get("fat_total_g") or 0) / serving,
+    }
+
+@timed("nutrition.lookup")
+def fetch_nutrition_api(food_name: str) -> Dict[str, float]:
+    """Get nutrition info from API Ninjas or fallback database"""
+    cleaned_name = clean_food_name(food_name)
+    
+    hit, cached = lookup_nutrition_local(cleaned_name)
+    if hit:
+        if cached is None:
+            raise NutritionNotFound(f"API lookup failed for '{food_name}': "
+                                    f"No nutrition data found for '{cleaned_name}' (cached)")
+        return cached
+    
+    cache = get_nutrition_cache()
+    try:
+        response = get_api_client().get(NUTRITION_API_URL,
+                                        params={"query": cleaned_name},
+                                        timeout=15)
+        
+        if response.status_code in API_RETRY_STATUSES:
+            raise APIUnavailableError(f"API error {response.status_code}: {response.text}")
+        if response.status_code != 200:
+            raise ValueError(f"API error {response.status_code}: {response.text}")
+        
+        with METRICS.span("nutrition.parse"):
+            data = response.json()
+            nutrition = nutrition_from_item(data[0]) if data else None
+        
+    except APIUnavailableError as e:
+        # API unhealthy: fail fast to the last known answer, else a weaker fuzzy match
+        stale = cache.get_stale(cleaned_name)
+        if stale is not None:
+            METRICS.inc("nutrition_lookups_total", source="stale_cache")
+            return stale
+        fallback = fuzzy_fallback(cleaned_name)
+        if fallback is not None:
+            return fallback
+        raise NutritionAPIError(f"API lookup failed for '{food_name}': {e}", retryable=True)
+    except Exception as e:
+        fallback = fuzzy_fallback(cleaned_name)
+        if fallback is not None:
+            return fallback
+        raise NutritionAPIError(f"API lookup failed for '{food_name}': {e}")
+    
+    # The API answered: trust it over a weak fuzzy match, even when it found nothing
+    cache.put(cleaned_name, nutrition)
+    if nutrition is None:
+        raise NutritionNotFound(f"API lookup failed for '{food_name}': "
+                                f"No nutrition data found for '{cleaned_name}'")
+    return nutrition
+
+def _fetch_nutrition_combined(cleaned_names: List[str]) -> Dict[str, Dict[str, float]]:
+    """One multi-item API query ("a and b and c"); results keyed by the requested name"""
+    response = get_api_client().get(NUTRITION_API_URL,
+                                    params={"query": " and ".join(cleaned_names)},
+                                    timeout=15)
+    if response.status_code in API_RETRY_STATUSES:
+        raise APIUnavailableError(f"API error {response.status_code}: {response.text}")
+    if response.status_code != 200:
+        raise ValueError(f"API error {response.status_code}: {response.text}")
+    matcher = FoodMatcher(cleaned_names)
+    resolved = {}
+    for item in response.json() or []:
+        match = matcher.match(clean_food_name(str(item.get("name", ""))))
+        if match is not None and match[0] not in resolved:
+            resolved[match[0]] = nutrition_from_item(item)
+    return resolved
+
+def resolve_nutrition_bulk(food_names: List[str], batch_size: int = NUTRITION_BATCH_SIZE,
+                           max_concurrency: int = HTTP_MAX_WORKERS):
+    """Resolve many food names, yielding (food_name, nutrition, error) as each resolves.
+    
+    Names are deduplicated after normalization. Local database and cache
+    hits are yielded immediately; the remaining misses are sent as combined
+    multi-item queries of batch_size names, at most max_concurrency at a
+    time. Names a combined answer doesn't cover, and every name of a batch
+    whose combined query fails, fall back to a single lookup (or the last
+    known answer while the API is down). nutrition is None when error is set.
+    """
+    by_key: Dict[str, List[str]] = {}
+    for name, key in zip(food_names, normalize_many(food_names)):
+        by_key.setdefault(key, []).append(name)
+    
+    cache = get_nutrition_cache()
+    misses = []
+    for key, names in by_key.items():
+        hit, nutrition = lookup_nutrition_local(key)
+        if not hit:
+            misses.append(key)
+            continue
+        error = None if nutrition is not None else f"No nutrition data found for '{key}' (cached)"
+        for name in names:
+            yield name, nutrition, error
+    
+    def resolve_batch(batch: List[str]) -> Dict[str, tuple]:
+        results = {}
+        try:
+            resolved = _fetch_nutrition_combined(batch)
+        except APIUnavailableError:
+            # API unhealthy: last known answers first, the rest go through
+            # fetch_nutrition_api one by one (the breaker fails them fast)
+            resolved = {}
+            for key in batch:
+                stale = cache.get_stale(key)
+                if stale is not None:
+                    METRICS.inc("nutrition_lookups_total", source="stale_cache")
+                    results[key] = (stale, None)
+        except Exception:
+            # Combined query rejected - a single bad name shouldn't fail the batch
+            resolved = {}
+        for key in batch:
+            if key in results:
+                continue
+            if key in resolved:
+                cache.put(key, resolved[key])
+                results[key] = (resolved[key], None)
+                continue
+            try:
+                results[key] = (fetch_nutrition_api(key), None)
+            except ValueError as e:
+                results[key] = (None, str(e))
+        return results
+    
+    batches = [misses[i:i + batch_size] for i in range(0, len(misses), batch_size)]
+    if not batches:
+        return
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        futures = [pool.submit(resolve_batch, batch) for batch in batches]
+        for future in as_completed(futures):
+            for key, (nutrition, error) in future.result().items():
+                for name in by_key[key]:
+                    yield name, nutrition, error
+
+def parse_shopping_list(text: str, default_grams: float = SHOPPING_LIST_DEFAULT_GRAMS):
+    """Parse "name[, grams]" lines into (name, grams) pairs, skipping blanks and #comments"""
+    items = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        name, _, amount = line.partition(",")
+        try:
+            grams = float(amount.strip().rstrip("g").strip()) if amount.strip() else default_grams
+        except ValueError:
+            grams = default_grams
+        if name.strip():
+            items.append((name.strip(), grams))
+    return items
+
+def _recipe_queries(ingredient_list: List[str], target_nutrient: str) -> List[str]:
+    """Search queries for an ingredient list (at most five are sent)"""
+    queries = []
+    
+    if len(ingredient_list) > 0:
+        queries.append(ingredient_list[0])
+    
+    if len(ingredient_list) > 1:
+        queries.append(f"{ingredient_list[0]} {ingredient_list[1]}")
+    
+    if len(ingredient_list) <= 3:
+        queries.append(" ".join(ingredient_list))
+    
+    queries.append(f"healthy {ingredient_list[0]}")
+    if target_nutrient == "protein":
+        queries.append(f"high protein {ingredient_list[0]}")
+    elif target_nutrient == "carbs":
+        queries.append(f"carb rich {ingredient_list[0]}")
+    
+    return queries[:5]
+
+def _fetch_recipe_query(query: str) -> List[Recipe]:
+    response = get_api_client().get(RECIPE_API_URL,
+                                    params={"query": query},
+                                    timeout=15)
+    if response.status_code != 200:
+        return []
+    with METRICS.span("recipes.parse"):
+        return [Recipe(
+                    title=recipe_data.get("title", "Unknown Recipe"),
+                    ingredients=recipe_data.get("ingredients", ""),
+                    instructions=recipe_data.get("instructions", ""),
+                    servings=recipe_data.get("servings", "Unknown servings")
+                ) for recipe_data in response.json()]
+
+@timed("recipes.search")
+def search_recipes_by_ingredients(ingredient_list: List[str], target_nutrient: str) -> List[Recipe]:
+    """Search for recipes using the ingredients and rank by nutritional value"""
+    local_store = get_local_recipe_store()
+    if OFFLINE_MODE and local_store is not None:
+        with METRICS.span("recipes.local_store"):
+            return local_store.search(ingredient_list, k=5)
+    
+    # Queries run concurrently; failed ones are skipped like before
+    all_recipes = []
+    queries = _recipe_queries(ingredient_list, target_nutrient)
+    with METRICS.span("recipes.fetch"):
+        results = get_api_client().map(_fetch_recipe_query, queries)
+    for result in results:
+        if isinstance(result, Exception):
+            continue
+        all_recipes.extend(result)
+    
+    if not all_recipes and local_store is not None:
+        # API down, rate-limited or empty - answer from the offline corpus
+        with METRICS.span("recipes.local_store"):
+            return local_store.search(ingredient_list, k=5)
+    
+    with METRICS.span("recipes.rank"):
+        return RecipeIndex(all_recipes).search(ingredient_list, k=5)
+
+@dataclass
+class RecipeRanking:
+    """Last item of a streamed search: the final top recipes, best first"""
+    recipes: List[Recipe]
+
+def iter_recipes_by_ingredients(ingredient_list: List[str], target_nutrient: str, k: int = 5,
+                                budget: Optional[float] = None):
+    """Streaming search_recipes_by_ingredients: yield recipes as queries complete.
+    
+    Each finished query's new matching recipes are ranked against
+    everything fetched so far and yielded best first (at most k of these
+    provisional picks), so the first recipe arrives after the first
+    round-trip. The search still waits for every query (or the ``budget``
+    seconds), then yields any final top-k recipe not streamed yet and a
+    RecipeRanking with the final order, as search_recipes_by_ingredients
+    would return it. Queries still pending when the stream ends are
+    cancelled.
+    """
+    local_store = get_local_recipe_store()
+    if OFFLINE_MODE and local_store is not None:
+        ranking = local_store.search(ingredient_list, k=k)
+        yield from ranking
+        if ranking:
+            yield RecipeRanking(ranking)
+        return
+    
+    client = get_api_client()
+    with deadline_budget(budget) as deadline:
+        futures = [client.submit(_fetch_recipe_query, query)
+                   for query in _recipe_queries(ingredient_list, target_nutrient)]
+    index = RecipeIndex()
+    streamed = set()
+    try:
+        for future in as_completed(futures, timeout=deadline.remaining() if deadline else None):
+            try:
+                recipes = future.result()
+            except Exception:
+                continue
+            if len(streamed) >= k:
+                for recipe in recipes:
+                    index.add(recipe)
+                continue
+            with METRICS.span("recipes.rank"):
+                first_new = len(index)
+                for recipe in recipes:
+                    index.add(recipe)
+                scores = index.scores(ingredient_list)
+                new_docs = [doc for doc in range(first_new, len(index)) if scores[doc] > 0]
+            for doc in sorted(new_docs, key=lambda d: scores[d], reverse=True)[:k - len(streamed)]:
+                recipe = index.recipes[doc]
+                streamed.add((recipe.title, recipe.ingredients))
+                yield replace(recipe, nutrition_score=float(scores[doc]))
+    except FuturesTimeoutError:
+        METRICS.inc("deadline_exceeded_total", endpoint="recipe")
+    finally:
+        # unread queries would still spend rate-limit tokens and API quota
+        for future in futures:
+            future.cancel()
+    
+    if not len(index) and local_store is not None:
+        ranking = local_store.search(ingredient_list, k=k)
+    else:
+        with METRICS.span("recipes.rank"):
+            ranking = index.search(ingredient_list, k=k)
+    for recipe in ranking:
+        if (recipe.title, recipe.ingredients) not in streamed:
+            yield recipe
+    if ranking:
+        yield RecipeRanking(ranking)
+
+def optimize_recipe_portions(recipe: Recipe, ingredients: List[Ingredient], 
+                           max_calories: float, target_nutrient: str,
+                           constraints: Optional["PortionConstraints"] = None) -> Dict:
+    """Optimize ingredient portions within the recipe context
+    
+    With only a calorie cap the greedy density fill is optimal; passing
+    constraints (macro limits, ratios, per-ingredient grams, whole units)
+    solves the exact LP/MILP with PortionOptimizer instead; max_calories
+    overrides constraints.max_calories.
+    """
+    if constraints is not None:
+        constraints = replace(constraints, max_calories=max_calories)
+        return PortionOptimizer(ingredients, target_nutrient).solve(constraints)
+    
+    table = IngredientTable.coerce(ingredients)
+    order = table.sorted_order(target_nutrient)
+    quantities = table.greedy_fill(max_calories, target_nutrient, order)
+    return table.result(quantities, target_nutrient, order)
+
+# ========================
+# Recipe Nutrition Analysis
+# ========================
+# Grams per unit for weights, millilitres per unit for volumes (converted
+# with FOOD_DENSITY), grams per item for count-like units. Abbreviations
+# cover the MealMaster style used by the recipe API ("1 c Rice|2 tb Butter").
+MASS_UNITS = {"g": 1.0, "mg": 0.001, "kg": 1000.0, "oz": 28.35, "lb": 453.6}
+VOLUME_UNITS = {"ml": 1.0, "l": 1000.0, "tsp": 4.93, "tbsp": 14.79, "floz": 29.57,
+                "cup": 236.6, "pint": 473.2, "quart": 946.4, "gallon": 3785.0}
+COUNT_UNITS = {"clove": 5.0, "slice": 30.0, "pinch": 0.4, "dash": 0.6, "can": 400.0,
+               "stick": 113.0, "package": 300.0, "handful": 30.0, "bunch": 150.0}
+UNIT_ALIASES = {
+    "g": "g", "gr": "g", "gram": "g", "grams": "g", "mg": "mg", "kg": "kg", "kilogram": "kg",
+    "kilograms": "kg", "oz": "oz", "ounce": "oz", "ounces": "oz", "lb": "lb", "lbs": "lb",
+    "pound": "lb", "pounds": "lb", "ml": "ml", "milliliter": "ml", "milliliters": "ml",
+    "l": "l", "liter": "l", "liters": "l", "litre": "l", "litres": "l",
+    "t": "tsp", "ts": "tsp", "tsp": "tsp", "tsps": "tsp", "teaspoon": "tsp", "teaspoons": "tsp",
+    "tb": "tbsp", "tbs": "tbsp", "tbl": "tbsp", "tbsp": "tbsp", "tbsps": "tbsp",
+    "tablespoon": "tbsp", "tablespoons": "tbsp", "floz": "floz",
+    "c": "cup", "cup": "cup", "cups": "cup", "pt": "pint", "pint": "pint", "pints": "pint",
+    "qt": "quart", "quart": "quart", "quarts": "quart", "gal": "gallon", "gallon": "gallon",
+    "clove": "clove", "cloves": "clove", "slice": "slice", "slices": "slice",
+    "pinch": "pinch", "pinches": "pinch", "dash": "dash", "dashes": "dash",
+    "can": "can", "cans": "can", "stick": "stick", "sticks": "stick",
+    "pk": "package", "pkg": "package", "package": "package", "packages": "package",
+    "handful": "handful", "handfuls": "handful", "bunch": "bunch", "bunches": "bunch",
+    "ea": "each", "each": "each", "whole": "each", "piece": "each", "pieces": "each",
+    "lg": "each", "large": "each", "md": "each", "medium": "each", "sm": "each", "small": "each",
+}
+# g/ml by head noun; anything else is treated like water
+FOOD_DENSITY = {"flour": 0.53, "sugar": 0.85, "rice": 0.79, "oat": 0.34, "oil": 0.92,
+                "butter": 0.96, "milk": 1.03, "honey": 1.42, "salt": 1.2, "yogurt": 1.04,
+                "cheese": 0.45, "broccoli": 0.38, "spinach": 0.13, "bean": 0.75,
+                "lentil": 0.81, "quinoa": 0.72, "pasta": 0.45, "nut": 0.6, "almond": 0.6,
+                "berry": 0.6, "cream": 1.0, "water": 1.0, "stock": 1.0, "broth": 1.0}
+# Grams per whole item by head noun
+FOOD_EACH_GRAMS = {"egg": 50.0, "banana": 118.0, "apple": 182.0, "onion": 110.0,
+                   "tomato": 123.0, "potato": 213.0, "carrot": 61.0, "lemon": 58.0,
+                   "lime": 44.0, "orange": 131.0, "garlic": 5.0, "pepper": 119.0,
+                   "breast": 174.0, "thigh": 116.0, "fillet": 170.0, "avocado": 150.0}
+DEFAULT_EACH_GRAMS = 100.0
+
+_FRACTION_CHARS = {"½": "1/2", "⅓": "1/3", "⅔": "2/3", "¼": "1/4", "¾": "3/4", "⅛": "1/8"}
+_AMOUNT = r"\d+/\d+|\d+(?:\.\d+)?(?:\s+\d+/\d+)?"
+_QUANTITY_PATTERN = re.compile(rf"\s*({_AMOUNT})(?:\s*(?:-|to)\s*({_AMOUNT}))?")
+_UNIT_PATTERN = re.compile(r"\s*([a-z]+)\.?(?![a-z-])")
+_PAREN_PATTERN = re.compile(r"\([^)]*\)")
+_LEADING_PAREN_PATTERN = re.compile(r"\s*\(([^)]*)\)")
+# Recipe convention: capital "T" is a tablespoon, lowercase "t" a teaspoon
+_TABLESPOON_T_PATTERN = re.compile(
+    rf"^(\s*(?:{_AMOUNT})(?:\s*(?:-|to)\s*(?:{_AMOUNT}))?\s*(?:\([^)]*\)\s*)?)T\b\.?")
+_PREP_PATTERN = re.compile(
+    r"\b(?:chopped|diced|minced|sliced|grated|shredded|peeled|crushed|packed|"
+    r"softened|melted|beaten|halved|boneless|skinless|finely|roughly|thinly|to taste|"
+    r"optional|plus more)\b")
+
+def _parse_amount(text: str) -> float:
+    whole, _, fraction = text.partition(" ")
+    if "/" in whole:
+        fraction, whole = whole, "0"
+    value = float(whole)
+    if fraction:
+        numerator, denominator = fraction.split("/")
+        value += float(numerator) / float(denominator) if float(denominator) else 0.0
+    return value
+
+def _leading_weight(text: str):
+    """Consume a leading "(15 oz)" and return (grams or None, rest of text)"""
+    paren = _LEADING_PAREN_PATTERN.match(text)
+    if not paren:
+        return None, text
+    inner = parse_ingredient_line(paren.group(1))
+    return (inner.grams if inner.unit in MASS_UNITS else None), text[paren.end():]
+
+def _head_noun(food: str) -> str:
+    tokens = recipe_tokens(food)
+    return tokens[-1] if tokens else ""
+
+@_slotted()
+@dataclass(frozen=True)
+class ParsedIngredient:
+    """One recipe ingredient line as (food, grams); grams is 0 when no amount is given"""
+    line: str
+    food: str                # cleaned food name, the nutrition lookup key
+    grams: float
+    quantity: Optional[float] = None
+    unit: Optional[str] = None
+
+@lru_cache(maxsize=CLEAN_NAME_CACHE_SIZE)
+def parse_ingredient_line(line: str) -> ParsedIngredient:
+    """Parse "2 cups cooked rice", "1 (14 oz) can tomatoes", "3 eggs" into food and grams"""
+    text = line
+    for char, fraction in _FRACTION_CHARS.items():
+        text = text.replace(char, f" {fraction}")
+    text = _TABLESPOON_T_PATTERN.sub(r"\1tbsp", text).lower()
+    text = text.replace("fl oz", "floz").replace("fl. oz", "floz")
+    
+    quantity = None
+    match = _QUANTITY_PATTERN.match(text)
+    if match:
+        quantity = _parse_amount(match.group(1))
+        if match.group(2):
+            quantity = (quantity + _parse_amount(match.group(2))) / 2
+        text = text[match.end():]
+    
+    # "1 (14 oz) can ..." or "2 cans (15 oz) ..." - an inner weight beats the can size
+    inner_grams, text = _leading_weight(text)
+    
+    unit = None
+    match = _UNIT_PATTERN.match(text)
+    if match and match.group(1) in UNIT_ALIASES:
+        unit = UNIT_ALIASES[match.group(1)]
+        text = text[match.end():]
+        if inner_grams is None:
+            inner_grams, text = _leading_weight(text)
+    
+    text = re.split(r"[,;]", _PAREN_PATTERN.sub(" ", text))[0]
+    text = re.sub(r"^\s*of\s+", "", _PREP_PATTERN.sub(" ", text))
+    food = clean_food_name(text)
+    
+    if quantity is None:
+        grams = 0.0
+    elif inner_grams is not None:
+        grams = quantity * inner_grams
+    elif unit in MASS_UNITS:
+        grams = quantity * MASS_UNITS[unit]
+    elif unit in VOLUME_UNITS:
+        grams = quantity * VOLUME_UNITS[unit] * FOOD_DENSITY.get(_head_noun(food), 1.0)
+    elif unit in COUNT_UNITS:
+        grams = quantity * COUNT_UNITS[unit]
+    else:
+        grams = quantity * FOOD_EACH_GRAMS.get(_head_noun(food), DEFAULT_EACH_GRAMS)
+    return ParsedIngredient(line, food, grams, quantity, unit)
+
+def parse_recipe_ingredients(recipe: Recipe) -> List[ParsedIngredient]:
+    """Parse the pipe-separated ingredient field of a recipe"""
+    return [parse_ingredient_line(line.strip())
+            for line in recipe.ingredients.split("|") if line.strip()]
+
+def _parse_servings(servings: str) -> float:
+    match = re.search(r"\d+", servings or "")
+    return float(match.group()) if match and int(match.group()) > 0 else 1.0
+
+@dataclass
+class RecipeNutrition:
+    """Estimated nutrition of a batch of recipes; rows follow ``recipes``"""
+    recipes: List[Recipe]
+    totals: np.ndarray           # (n, 4) calories, protein, carbs, fat for the whole recipe
+    servings: np.ndarray         # (n,) parsed servings (1 when unknown)
+    coverage: np.ndarray         # (n,) share of lines with an amount and known nutrition
+    unresolved: List[List[str]]  # foods without nutrition data, per recipe
+    
+    def per_serving(self) -> np.ndarray:
+        return self.totals / self.servings[:, None]
+    
+    def density(self, nutrient: str) -> np.ndarray:
+        """Grams of nutrient per calorie for each recipe"""
+        calories = self.totals[:, 0]
+        values = self.totals[:, NUTRIENT_FIELDS.index(nutrient)]
+        return np.divide(values, calories, out=np.zeros(len(calories)), where=calories > 0)
+    
+    def ranking(self, nutrient: str, k: Optional[int] = None) -> List[int]:
+        """Recipe rows by descending nutrient density (stable on ties)"""
+        order = np.argsort(-self.density(nutrient), kind="stable")
+        return order[:k].tolist()
+    
+    def to_dicts(self) -> List[Dict]:
+        per_serving = self.per_serving()
+        results = []
+        for i, recipe in enumerate(self.recipes):
+            total = dict(zip(NUTRIENT_FIELDS, map(float, self.totals[i])))
+            results.append({"title": recipe.title,
+                            "servings": float(self.servings[i]),
+                            "total": total,
+                            "per_serving": dict(zip(NUTRIENT_FIELDS, map(float, per_serving[i]))),
+                            "macros_breakdown": macros_breakdown(total),
+                            "coverage": float(self.coverage[i]),
+                            "unresolved": self.unresolved[i]})
+        return results
+
+def analyze_recipes(recipes: List[Recipe], use_api: bool = True) -> RecipeNutrition:
+    """Estimate total nutrition for many recipes at once.
+    
+    Every line is parsed (memoized), each distinct food is resolved once
+    through resolve_nutrition_bulk (local DB, cache, then batched API
+    queries; local only when use_api is False), and the per-recipe totals
+    come from one weighted bincount per nutrient.
+    """
+    recipe_rows, foods, grams = [], [], []
+    for row, recipe in enumerate(recipes):
+        for parsed in parse_recipe_ingredients(recipe):
+            if not parsed.food:      # "1 cup", "3 oz." - nothing to look up
+                continue
+            recipe_rows.append(row)
+            foods.append(parsed.food)
+            grams.append(parsed.grams)
+    
+    unique_foods = sorted(set(foods))
+    food_index = {food: i for i, food in enumerate(unique_foods)}
+    nutrition = np.zeros((len(unique_foods), len(NUTRIENT_FIELDS)))
+    known = np.zeros(len(unique_foods), dtype=bool)
+    if use_api:
+        resolved = ((food, values) for food, values, _ in resolve_nutrition_bulk(unique_foods))
+    else:
+        resolved = ((food, lookup_nutrition_local(food)[1] or fuzzy_fallback(food))
+                    for food in unique_foods)
+    for food, values in resolved:
+        if values is not None:
+            nutrition[food_index[food]] = [values[f] for f in NUTRIENT_FIELDS]
+            known[food_index[food]] = True
+    
+    rows = np.asarray(recipe_rows, dtype=np.intp)
+    line_foods = np.asarray([food_index[food] for food in foods], dtype=np.intp)
+    line_grams = np.asarray(grams, dtype=np.float64)
+    contributions = line_grams[:, None] * nutrition[line_foods]
+    totals = np.column_stack([np.bincount(rows, weights=contributions[:, j], minlength=len(recipes))
+                              for j in range(len(NUTRIENT_FIELDS))]).reshape(-1, len(NUTRIENT_FIELDS))
+    
+    counted = known[line_foods] & (line_grams > 0)
+    line_counts = np.bincount(rows, minlength=len(recipes))
+    coverage = np.divide(np.bincount(rows, weights=counted, minlength=len(recipes)), line_counts,
+                         out=np.zeros(len(recipes)), where=line_counts > 0)
+    unresolved = [[] for _ in recipes]
+    for row, food_id in zip(recipe_rows, line_foods.tolist()):
+        if not known[food_id] and unique_foods[food_id] not in unresolved[row]:
+            unresolved[row].append(unique_foods[food_id])
+    servings = np.array([_parse_servings(recipe.servings) for recipe in recipes], dtype=np.float64)
+    return RecipeNutrition(list(recipes), totals, servings, coverage, unresolved)
+
+# ========================
+# Exact Portion Optimization Engine (LP / MILP)
+# ========================
+@dataclass
+class PortionConstraints:
+    """Linear constraints for the exact portion optimizer (all amounts in grams)"""
+    max_calories: float
+    min_calories: float = 0.0
+    nutrient_min: Dict[str, float] = field(default_factory=dict)   # e.g. {"protein": 40}
+    nutrient_max: Dict[str, float] = field(default_factory=dict)   # e.g. {"fat": 20}
+    ratio_min: Dict[str, float] = field(default_factory=dict)      # min share of calories, e.g. {"protein": 0.3}
+    ratio_max: Dict[str, float] = field(default_factory=dict)      # max share of calories, e.g. {"fat": 0.25}
+    ingredient_min: Dict[str, float] = field(default_factory=dict) # grams by ingredient name
+    ingredient_max: Dict[str, float] = field(default_factory=dict) # grams by ingredient name
+    units: Dict[str, float] = field(default_factory=dict)          # grams per whole unit, e.g. {"egg": 50}
+
+class _BoundedSimplex:
+    """Dense bounded-variable simplex for  max c.x  s.t.  A x + s = b,  lo <= x <= hi.
+    
+    Columns are [structural | slacks | artificials]. The basis is kept
+    between solves so a change to b, lo or hi restarts from the previous
+    optimum with dual simplex pivots instead of from scratch.
+    """
+    
+    TOL = 1e-9
+    MAX_ITER = 50000
+    
+    def __init__(self, A: np.ndarray, c: np.ndarray):
+        m, n = A.shape
+        self.m, self.n = m, n
+        self.M = np.hstack([A, np.eye(m), -np.eye(m)])
+        self.c = np.concatenate([c, np.zeros(2 * m)])
+        self.basis = None
+        self.at_upper = None
+    
+    def _values(self, b, lo, hi):
+        x = np.where(self.at_upper, hi, lo)
+        x[self.basis] = 0.0
+        B = self.M[:, self.basis]
+        x[self.basis] = np.linalg.solve(B, b - self.M @ x)
+        return x, B
+    
+    def _reduced_costs(self, c, B):
+        y = np.linalg.solve(B.T, c[self.basis])
+        d = c - y @ self.M
+        d[self.basis] = 0.0
+        return d
+    
+    def _primal(self, c, b, lo, hi) -> str:
+        tol = self.TOL
+        degenerate = 0
+        for _ in range(self.MAX_ITER):
+            x, B = self._values(b, lo, hi)
+            d = self._reduced_costs(c, B)
+            nonbasic = np.ones(len(c), dtype=bool)
+            nonbasic[self.basis] = False
+            movable = nonbasic & (hi - lo > tol)
+            eligible = movable & (((~self.at_upper) & (d > tol)) | (self.at_upper & (d < -tol)))
+            if not eligible.any():
+                return "optimal"
+            # Dantzig pricing, falling back to Bland's rule while stalling
+            j = int(np.flatnonzero(eligible)[0]) if degenerate > 50 else \
+                int(np.argmax(np.where(eligible, np.abs(d), 0.0)))
+            direction = -1.0 if self.at_upper[j] else 1.0
+            delta = -direction * np.linalg.solve(B, self.M[:, j])
+            xB, loB, hiB = x[self.basis], lo[self.basis], hi[self.basis]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                ratios = np.where(delta < -tol, (xB - loB) / -delta,
+                                  np.where(delta > tol, (hiB - xB) / delta, np.inf))
+            ratios = np.maximum(ratios, 0.0)
+            r = int(np.argmin(ratios))
+            step = ratios[r]
+            span = hi[j] - lo[j]
+            if span <= step:
+                self.at_upper[j] = not self.at_upper[j]
+                step = span
+            elif np.isinf(step):
+                return "unbounded"
+            else:
+                leaving = self.basis[r]
+                self.at_upper[leaving] = delta[r] > 0
+                self.basis[r] = j
+                self.at_upper[j] = False
+            degenerate = degenerate + 1 if step <= tol else 0
+        return "iteration_limit"
+    
+    def _dual(self, c, b, lo, hi) -> str:
+        """Restore primal feasibility from a dual-feasible basis"""
+        tol = 1e-7
+        for _ in range(self.MAX_ITER):
+            x, B = self._values(b, lo, hi)
+            xB, loB, hiB = x[self.basis], lo[self.basis], hi[self.basis]
+            infeasibility = np.maximum(loB - xB, xB - hiB)
+            r = int(np.argmax(infeasibility))
+            if infeasibility[r] <= tol:
+                return "optimal"
+            below = xB[r] < loB[r]
+            d = self._reduced_costs(c, B)
+            rho = np.linalg.solve(B.T, np.eye(self.m)[r])
+            alpha = rho @ self.M
+            nonbasic = np.ones(len(c), dtype=bool)
+            nonbasic[self.basis] = False
+            movable = nonbasic & (hi - lo > self.TOL)
+            # Entering candidates move x_B[r] back toward its violated bound
+            if below:
+                eligible = movable & (((~self.at_upper) & (alpha < -self.TOL)) |
+                                      (self.at_upper & (alpha > self.TOL)))
+            else:
+                eligible = movable & (((~self.at_upper) & (alpha > self.TOL)) |
+                                      (self.at_upper & (alpha < -self.TOL)))
+            if not eligible.any():
+                return "infeasible"
+            with np.errstate(divide="ignore", invalid="ignore"):
+                ratios = np.where(eligible, np.abs(d / alpha), np.inf)
+            j = int(np.argmin(ratios))
+            leaving = self.basis[r]
+            self.at_upper[leaving] = not below
+            self.basis[r] = j
+            self.at_upper[j] = False
+        return "iteration_limit"
+    
+    def _dual_feasible(self, c, b, lo, hi) -> bool:
+        _, B = self._values(b, lo, hi)
+        d = self._reduced_costs(c, B)
+        nonbasic = np.ones(len(c), dtype=bool)
+        nonbasic[self.basis] = False
+        movable = nonbasic & (hi - lo > self.TOL)
+        bad = movable & (((~self.at_upper) & (d > 1e-7)) | (self.at_upper & (d < -1e-7)))
+        return not bad.any()
+    
+    def solve(self, b: np.ndarray, lo: np.ndarray, hi: np.ndarray, warm: bool = True):
+        """Solve for structural bounds lo/hi; returns (status, x, objective)"""
+        m, n = self.m, self.n
+        lo = np.concatenate([lo, np.zeros(2 * m)])
+        hi_phase2 = np.concatenate([hi, np.full(m, np.inf), np.zeros(m)])
+        
+        status = None
+        if warm and self.basis is not None:
+            self.at_upper &= np.isfinite(hi_phase2)
+            try:
+                if self._dual_feasible(self.c, b, lo, hi_phase2):
+                    status = self._dual(self.c, b, lo, hi_phase2)
+                    if status == "optimal":
+                        status = self._primal(self.c, b, lo, hi_phase2)
+            except np.linalg.LinAlgError:
+                status = None
+        
+        if status is None:
+            # Cold start: slacks cover rows with room, artificials the rest
+            self.at_upper = np.zeros(n + 2 * m, dtype=bool)
+            residual = b - self.M[:, :n] @ lo[:n]
+            self.basis = [n + i if residual[i] >= 0 else n + m + i for i in range(m)]
+            hi_phase1 = hi_phase2.copy()
+            hi_phase1[n + m:] = np.inf
+            c_phase1 = np.concatenate([np.zeros(n + m), -np.ones(m)])
+            status = self._primal(c_phase1, b, lo, hi_phase1)
+            x, _ = self._values(b, lo, hi_phase1)
+            if x[n + m:].sum() > 1e-7:
+                return "infeasible", None, None
+            status = self._primal(self.c, b, lo, hi_phase2)
+        
+        if status != "optimal":
+            return status, None, None
+        x, _ = self._values(b, lo, hi_phase2)
+        x = np.clip(x[:n], lo[:n], hi)
+        return status, x, float(self.c[:n] @ x)
+
+class PortionOptimizer:
+    """Exact portion optimizer: maximize a target nutrient under linear constraints.
+    
+    The problem is built as a dense NumPy matrix and solved with a bounded
+    simplex; ingredients listed in PortionConstraints.units are solved as
+    whole units with branch and bound. Re-solving after only bounds change
+    (calorie cap, macro min/max, per-ingredient grams) warm-starts from the
+    previous optimal basis.
+    """
+    
+    MAX_NODES = 10000
+    
+    def __init__(self, ingredients, target_nutrient: str):
+        self.table = IngredientTable.coerce(ingredients)
+        self.target_nutrient = target_nutrient
+        # rows: ingredients, columns: calories, protein, carbs, fat (per gram)
+        self.nutrients = self.table.nutrient_matrix()
+        self._solver = None
+        self._structure = None
+    
+    def _column(self, nutrient: str) -> np.ndarray:
+        return self.nutrients[:, NUTRIENT_FIELDS.index(nutrient)]
+    
+    def _build(self, constraints: PortionConstraints, scale: np.ndarray):
+        """Return (A, b, c) for the constraint set with columns scaled to units"""
+        calories = self._column("calories")
+        rows, rhs = [calories], [constraints.max_calories]
+        if constraints.min_calories > 0:
+            rows.append(-calories)
+            rhs.append(-constraints.min_calories)
+        for nutrient, amount in sorted(constraints.nutrient_min.items()):
+            rows.append(-self._column(nutrient))
+            rhs.append(-amount)
+        for nutrient, amount in sorted(constraints.nutrient_max.items()):
+            rows.append(self._column(nutrient))
+            rhs.append(amount)
+        # share of calories from a macro: k*m.x <= r*cal.x  (and >= for minimums)
+        for nutrient, ratio in sorted(constraints.ratio_max.items()):
+            rows.append(MACRO_CALORIES[nutrient] * self._column(nutrient) - ratio * calories)
+            rhs.append(0.0)
+        for nutrient, ratio in sorted(constraints.ratio_min.items()):
+            rows.append(ratio * calories - MACRO_CALORIES[nutrient] * self._column(nutrient))
+            rhs.append(0.0)
+        A = np.vstack(rows) * scale
+        c = self._column(self.target_nutrient) * scale
+        return A, np.array(rhs, dtype=float), c
+    
+    def solve(self, constraints: PortionConstraints) -> Dict:
+        """Solve and return results in the optimize_recipe_portions format"""
+        names = self.table.names
+        scale = np.array([constraints.units.get(name, 1.0) for name in names], dtype=float)
+        integer = np.array([name in constraints.units for name in names], dtype=bool)
+        
+        lo = np.array([constraints.ingredient_min.get(name, 0.0) for name in names], dtype=float)
+        hi = np.array([constraints.ingredient_max.get(name, np.inf) for name in names], dtype=float)
+        hi = np.minimum(hi, self.table.quantity)
+        lo, hi = lo / scale, hi / scale
+        lo[integer] = np.ceil(lo[integer] - 1e-9)
+        hi[integer] = np.floor(hi[integer] + 1e-9)
+        
+        A, b, c = self._build(constraints, scale)
+        if (self._structure is None or self._structure[0].shape != A.shape or
+                not np.array_equal(self._structure[0], A) or
+                not np.array_equal(self._structure[1], c)):
+            self._solver = _BoundedSimplex(A, c)
+            self._structure = (A, c)
+        
+        if np.any(lo > hi):
+            status, x, objective = "infeasible", None, None
+        elif integer.any():
+            status, x, objective = self._branch_and_bound(b, lo, hi, integer)
+        else:
+            status, x, objective = self._solver.solve(b, lo, hi)
+        
+        grams = x * scale if x is not None else np.zeros(len(self.table))
+        result = self.table.result(grams, self.target_nutrient)
+        result["status"] = status
+        return result
+    
+    def _branch_and_bound(self, b, lo, hi, integer):
+        """Depth-first branch and bound over whole-unit ingredients"""
+        best_x, best_obj = None, -np.inf
+        root_basis = None
+        stack = [(lo, hi, None)]
+        nodes = 0
+        status = "optimal"
+        while stack:
+            nodes += 1
+            if nodes > self.MAX_NODES:
+                status = "node_limit"
+                break
+            node_lo, node_hi, warm_state = stack.pop()
+            if warm_state is not None:
+                self._solver.basis, self._solver.at_upper = list(warm_state[0]), warm_state[1].copy()
+            node_status, x, objective = self._solver.solve(b, node_lo, node_hi)
+            if node_status != "optimal" or objective <= best_obj + 1e-9:
+                continue
+            if root_basis is None:
+                root_basis = (list(self._solver.basis), self._solver.at_upper.copy())
+            fractional = integer & (np.abs(x - np.round(x)) > 1e-6)
+            if not fractional.any():
+                best_x, best_obj = np.where(integer, np.round(x), x), objective
+                continue
+            j = int(np.argmax(np.where(fractional, np.abs(x - np.round(x)), 0.0)))
+            state = (list(self._solver.basis), self._solver.at_upper.copy())
+            down_hi = node_hi.copy()
+            down_hi[j] = np.floor(x[j])
+            up_lo = node_lo.copy()
+            up_lo[j] = np.ceil(x[j])
+            stack.append((node_lo, down_hi, state))
+            stack.append((up_lo, node_hi, state))
+        # keep the root basis for warm-starting the next solve
+        if root_basis is not None:
+            self._solver.basis, self._solver.at_upper = root_basis
+        if best_x is None:
+            return ("infeasible" if status == "optimal" else status), None, None
+        return status, best_x, best_obj
+
+# ========================
+# Batch Scenario Optimization
+# ========================
+class GreedyPrefixIndex:
+    """Prefix sums over the greedy density order for one (ingredient set, nutrient).
+    
+    The greedy fill at any calorie cap takes a whole prefix of the sorted
+    rows plus part of the next one, so totals for a cap are read off
+    cumulative sums with a binary search instead of re-sorting. Rows can be
+    inserted or discarded without a full rebuild.
+    
+    `cost` names the capped nutrient (calories by default); rows are
+    ordered by target per gram of that nutrient, and rows that add the
+    target at no cost come first, whatever the cost.
+    """
+    
+    def __init__(self, table: IngredientTable, target_nutrient: str, cost: str = "calories"):
+        self.table = table
+        self.target_nutrient = target_nutrient
+        self.cost = cost
+        self._cost_column = NUTRIENT_FIELDS.index(cost)
+        scores = self._cost_scores(np.arange(len(table)))
+        order = np.argsort(-scores, kind="stable")
+        self.order = order[self._usable(order, scores[order])]
+        self.scores = scores[self.order]
+        self.prefix = np.zeros((1, 4))
+        self._recompute_from(0)
+    
+    def _cost_scores(self, rows: np.ndarray) -> np.ndarray:
+        """Target per gram of the cost nutrient; inf for rows that add it for free"""
+        values = self.table.column(self.target_nutrient)[rows]
+        costs = self.table.column(self.cost)[rows]
+        scores = np.zeros(len(rows))
+        np.divide(values, costs, out=scores, where=costs > 0)
+        scores[(costs <= 0) & (values > 0)] = np.inf
+        return scores
+    
+    def _usable(self, rows: np.ndarray, scores: np.ndarray) -> np.ndarray:
+        """Rows worth filling: in stock, and either costing something or free with the target"""
+        return (self.table.quantity[rows] > 0) & (
+            (self.table.column(self.cost)[rows] > 0) | np.isinf(scores))
+    
+    def _recompute_from(self, position: int):
+        """Rebuild prefix sums for order[position:], keeping the rows before it"""
+        rows = self.order[position:]
+        per_row = self.table.nutrient_matrix(rows) * self.table.quantity[rows][:, None]
+        # prefix[k] = totals of the first k rows; column 0 is calories
+        self.prefix = np.vstack([self.prefix[:position + 1],
+                                 self.prefix[position] + np.cumsum(per_row, axis=0)])
+        self.cum_cost = self.prefix[1:, self._cost_column]
+    
+    def insert(self, row: int):
+        """Account for a row appended to the table"""
+        rows = np.array([row])
+        scores = self._cost_scores(rows)
+        if not self._usable(rows, scores)[0]:
+            return
+        score = float(scores[0])
+        # appended rows sort after equal scores, matching the stable sort
+        position = int(np.searchsorted(-self.scores, -score, side="right"))
+        self.order = np.insert(self.order, position, row)
+        self.scores = np.insert(self.scores, position, score)
+        self._recompute_from(position)
+    
+    def discard(self, row: int):
+        """Account for a row deleted from the table (call after IngredientTable.delete)"""
+        hits = np.flatnonzero(self.order == row)
+        position = int(hits[0]) if len(hits) else None
+        if position is not None:
+            self.order = np.delete(self.order, position)
+            self.scores = np.delete(self.scores, position)
+        self.order[self.order > row] -= 1
+        if position is not None:
+            self._recompute_from(position)
+    
+    def query(self, caps):
+        """Vectorized fill for an array of caps: (full_rows, partial_grams, totals)"""
+        caps = np.maximum(np.asarray(caps, dtype=np.float64), 0.0)
+        full_rows = np.searchsorted(self.cum_cost, caps, side="right")
+        partial_grams = np.zeros(len(caps))
+        totals = self.prefix[full_rows].copy()
+        has_partial = full_rows < len(self.order)
+        if has_partial.any():
+            rows = self.order[full_rows[has_partial]]
+            remaining = caps[has_partial] - self.prefix[full_rows[has_partial], self._cost_column]
+            partial_grams[has_partial] = remaining / self.table.column(self.cost)[rows]
+            totals[has_partial] += (self.table.nutrient_matrix(rows) *
+                                    partial_grams[has_partial][:, None])
+        return full_rows, partial_grams, totals
+    
+    def totals_at(self, cap: float) -> Dict[str, float]:
+        """Total calories and macros of the greedy fill at one cap, in O(log n)"""
+        _, _, totals = self.query([cap])
+        return {f: float(v) for f, v in zip(NUTRIENT_FIELDS, totals[0])}
+    
+    def at(self, cap: float) -> Dict:
+        """Full optimize_recipe_portions result at one cap"""
+        full_rows, partial_grams, totals = self.query([cap])
+        return self.result(int(full_rows[0]), float(partial_grams[0]), totals[0])
+    
+    def result(self, full_rows: int, partial_grams: float, totals: np.ndarray) -> Dict:
+        """Optimization result in the optimize_recipe_portions format"""
+        names, quantity = self.table.names, self.table.quantity
+        portions = {names[i]: float(quantity[i]) for i in self.order[:full_rows]}
+        if partial_grams > 1e-9:
+            portions[names[self.order[full_rows]]] = float(partial_grams)
+        totals = {f: float(v) for f, v in zip(NUTRIENT_FIELDS, totals)}
+        return {
+            "portions": portions,
+            "total_calories": totals["calories"],
+            f"total_{self.target_nutrient}": totals[self.target_nutrient],
+            "total_protein": totals["protein"],
+            "total_carbs": totals["carbs"],
+            "total_fat": totals["fat"],
+            "macros_breakdown": macros_breakdown(totals)
+        }
+
+class GreedyIndexCache:
+    """Per-nutrient GreedyPrefixIndex cache for a mutable ingredient set.
+    
+    Indices are built on first use and updated in place as ingredients are
+    added or removed, so slider-style queries never re-sort.
+    """
+    
+    def __init__(self, ingredients: List[Ingredient] = ()):
+        self.table = IngredientTable.from_ingredients(list(ingredients))
+        self._indices: Dict[str, GreedyPrefixIndex] = {}
+    
+    def index(self, target_nutrient: str) -> GreedyPrefixIndex:
+        if target_nutrient not in self._indices:
+            self._indices[target_nutrient] = GreedyPrefixIndex(self.table, target_nutrient)
+        return self._indices[target_nutrient]
+    
+    def add(self, ingredient: Ingredient):
+        row = self.table.append(ingredient)
+        for index in self._indices.values():
+            index.insert(row)
+    
+    def remove(self, row: int):
+        self.table.delete(row)
+        for index in self._indices.values():
+            index.discard(row)
+    
+    def clear(self):
+        self.table = IngredientTable.from_ingredients([])
+        self._indices.clear()
+    
+    def totals_at(self, max_calories: float, target_nutrient: str) -> Dict[str, float]:
+        return self.index(target_nutrient).totals_at(max_calories)
+    
+    def result(self, max_calories: float, target_nutrient: str) -> Dict:
+        return self.index(target_nutrient).at(max_calories)
+    
+    def frontier(self, target_nutrient: str) -> "ParetoFrontier":
+        """Calorie frontier over the current ingredients (reads the cached index)"""
+        return ParetoFrontier(self.index(target_nutrient))
+
+def optimize_scenarios(ingredients, calorie_caps: List[float],
+                       target_nutrients: List[str] = ("protein", "carbs", "fat")) -> List[Dict]:
+    """Solve every (max_calories, target_nutrient) pair for one ingredient set
+    
+    The density sort and prefix sums are built once per nutrient and all
+    caps are answered together, so a sweep costs about one solve. Each
+    result is the optimize_recipe_portions dict plus its "max_calories"
+    and "target_nutrient".
+    """
+    table = IngredientTable.coerce(ingredients)
+    results = []
+    for nutrient in target_nutrients:
+        index = GreedyPrefixIndex(table, nutrient)
+        full_rows, partial_grams, totals = index.query(calorie_caps)
+        for cap, k, partial, total in zip(calorie_caps, full_rows, partial_grams, totals):
+            result = index.result(int(k), float(partial), total)
+            result["max_calories"] = cap
+            result["target_nutrient"] = nutrient
+            results.append(result)
+    return results
+
+# ========================
+# Pareto Frontier Explorer
+# ========================
+class ParetoFrontier:
+    """Most target nutrient achievable for every budget of a cost nutrient.
+    
+    Filling in density order is optimal for the continuous problem, so the
+    frontier is the concave piecewise-linear curve through the prefix
+    totals of a GreedyPrefixIndex: the k-th breakpoint holds the first k
+    ingredients of that order in full, and any budget in between adds part
+    of one more. With calories as the cost, every point matches
+    optimize_recipe_portions at that cap, so a whole session of cap
+    changes is answered from one sort.
+    """
+    
+    def __init__(self, index: GreedyPrefixIndex):
+        self.index = index
+        self.target_nutrient = index.target_nutrient
+        self.cost = index.cost
+        costs = index.prefix[:, index._cost_column]
+        # free rows share cost 0 with the empty fill; keep the last of that run
+        self.full_rows = np.flatnonzero(np.append(np.diff(costs) > 0, True))
+        self.totals = index.prefix[self.full_rows]
+        self.costs = self.totals[:, index._cost_column]
+        self.values = self.totals[:, NUTRIENT_FIELDS.index(self.target_nutrient)]
+    
+    @classmethod
+    def build(cls, ingredients, target_nutrient: str = "protein",
+              cost: str = "calories") -> "ParetoFrontier":
+        if target_nutrient == cost:
+            raise ValueError("target_nutrient and cost must differ")
+        return cls(GreedyPrefixIndex(IngredientTable.coerce(ingredients), target_nutrient, cost))
+    
+    def __len__(self) -> int:
+        return len(self.full_rows)
+    
+    def value_at(self, budget):
+        """Best target amount for a budget (or array of budgets), by interpolation"""
+        return np.interp(budget, self.costs, self.values)
+    
+    def point(self, budget: float) -> Dict:
+        """Full optimize_recipe_portions-style result at one budget"""
+        return self.index.at(budget)
+    
+    def breakpoints(self) -> List[Dict]:
+        """Every vertex: cost, value, totals, the ingredient it adds and its portions"""
+        names, quantity, order = self.index.table.names, self.index.table.quantity, self.index.order
+        points, portions, taken = [], {}, 0
+        for k, totals in zip(self.full_rows, self.totals):
+            added = None
+            for row in order[taken:k]:
+                portions[names[row]] = float(quantity[row])
+                added = names[row]
+            taken = k
+            totals = {f: float(v) for f, v in zip(NUTRIENT_FIELDS, totals)}
+            points.append({"cost": totals[self.cost], "value": totals[self.target_nutrient],
+                           "added": added, "portions": dict(portions), "totals": totals})
+        return points
+    
+    def to_dict(self) -> Dict:
+        return {"target_nutrient": self.target_nutrient, "cost": self.cost,
+                "breakpoints": self.breakpoints()}
+
+def pareto_frontier(ingredients, target_nutrient: str = "protein",
+                    cost: str = "calories") -> ParetoFrontier:
+    """Trade-off curve of target_nutrient against cost (calories, or another macro)"""
+    return ParetoFrontier.build(ingredients, target_nutrient, cost)
+
+# ========================
+# Optimization Result Cache
+# ========================
+def optimization_key(ingredients, max_calories: float, target_nutrient: str,
+                     constraints: Optional[PortionConstraints] = None) -> str:
+    """Content hash of an ingredient set plus cap, nutrient and constraints"""
+    table = IngredientTable.coerce(ingredients)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{target_nutrient}|{float(max_calories)!r}|".encode("utf-8"))
+    digest.update("\x1f".join(table.names).encode("utf-8"))
+    digest.update(np.stack([table.quantity] + [table.column(f) for f in NUTRIENT_FIELDS]).tobytes())
+    if constraints is not None:
+        digest.update(json.dumps(asdict(constraints), sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+def _copy_result(result: Dict) -> Dict:
+    """Shallow copy with fresh portions/macros dicts so callers cannot alter cached entries"""
+    return {**result, "portions": dict(result["portions"]),
+            "macros_breakdown": dict(result["macros_breakdown"])}
+
+class OptimizationCache:
+    """Thread-safe LRU of optimize_recipe_portions results keyed on optimization_key"""
+    
+    def __init__(self, max_entries: int = OPTIMIZATION_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                METRICS.inc("optimization_cache_total", result="miss")
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            METRICS.inc("optimization_cache_total", result="hit")
+            return _copy_result(result)
+    
+    def put(self, key: str, result: Dict):
+        with self._lock:
+            self._entries[key] = _copy_result(result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def optimize(self, ingredients, max_calories: float, target_nutrient: str,
+                 constraints: Optional[PortionConstraints] = None) -> Dict:
+        """Cached optimize_recipe_portions (the recipe argument never affects the result)"""
+        key = optimization_key(ingredients, max_calories, target_nutrient, constraints)
+        result = self.get(key)
+        if result is None:
+            result = optimize_recipe_portions(None, ingredients, max_calories, target_nutrient,
+                                              constraints)
+            self.put(key, result)
+        return result
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries,
+                    "hits": self.hits, "misses": self.misses}
+
+_optimization_cache: Optional[OptimizationCache] = None
+
+def get_optimization_cache() -> OptimizationCache:
+    """Shared result cache used by the GUI, CLI, service and batch callers"""
+    global _optimization_cache
+    if _optimization_cache is None:
+        _optimization_cache = OptimizationCache()
+    return _optimization_cache
+
+def optimize_portions_cached(ingredients, max_calories: float, target_nutrient: str,
+                             constraints: Optional[PortionConstraints] = None) -> Dict:
+    return get_optimization_cache().optimize(ingredients, max_calories, target_nutrient,
+                                             constraints)
+
+def recipe_ingredients(recipe: Recipe, ingredients: List[Ingredient]) -> List[Ingredient]:
+    """The pantry ingredients a recipe actually uses (possibly none).
+    
+    An ingredient counts as used when its cleaned name and one of the
+    recipe's parsed foods contain each other's tokens one way or the other
+    ("chicken" and "chicken breast"); "sesame oil" does not use "olive oil".
+    """
+    foods = [set(_food_key(parsed.food).split()) for parsed in parse_recipe_ingredients(recipe)
+             if parsed.food]
+    subset = []
+    for ing in ingredients:
+        tokens = set(_food_key(clean_food_name(ing.name)).split())
+        if tokens and any(food <= tokens or tokens <= food for food in foods):
+            subset.append(ing)
+    return subset
+
+def optimize_for_recipe(recipe: Recipe, ingredients: List[Ingredient], max_calories: float,
+                        target_nutrient: str,
+                        constraints: Optional[PortionConstraints] = None) -> Dict:
+    """Cached optimization restricted to the ingredients the recipe uses"""
+    return optimize_portions_cached(recipe_ingredients(recipe, ingredients), max_calories,
+                                    target_nutrient, constraints)
+
+# ========================
+# Headless Core API
+# ========================
+@dataclass
+class OptimizationResult:
+    """Optimized portions with totals and macro breakdown"""
+    target_nutrient: str
+    max_calories: float
+    portions: Dict[str, float]
+    total_calories: float
+    total_protein: float
+    total_carbs: float
+    total_fat: float
+    macros_breakdown: Dict[str, float]
+    status: str = "optimal"
+    
+    @property
+    def target_amount(self) -> float:
+        return getattr(self, f"total_{self.target_nutrient}", 0.0)
+    
+    @property
+    def total_weight(self) -> float:
+        return sum(self.portions.values())
+    
+    @classmethod
+    def from_dict(cls, optimization: Dict, target_nutrient: str,
+                  max_calories: float) -> "OptimizationResult":
+        """Wrap an optimize_recipe_portions result dict"""
+        return cls(target_nutrient=target_nutrient,
+                   max_calories=max_calories,
+                   portions=dict(optimization["portions"]),
+                   total_calories=optimization["total_calories"],
+                   total_protein=optimization["total_protein"],
+                   total_carbs=optimization["total_carbs"],
+                   total_fat=optimization["total_fat"],
+                   macros_breakdown=dict(optimization["macros_breakdown"]),
+                   status=optimization.get("status", "optimal"))
+    
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+@dataclass
+class RecipeSuggestion:
+    """A found recipe together with the portions optimized for it"""
+    recipe: Recipe
+    optimization: OptimizationResult
+
+@dataclass
+class GenerationResult:
+    """Everything generate_recipes produced for one request"""
+    ingredients: List[Ingredient]
+    max_calories: float
+    target_nutrient: str
+    recipes: List[RecipeSuggestion] = field(default_factory=list)
+    custom: Optional[OptimizationResult] = None   # set when no recipes were found
+    
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+def custom_optimization(ingredients: List[Ingredient], max_calories: float,
+                        target_nutrient: str) -> OptimizationResult:
+    """Optimize portions without a recipe (the no-recipes-found fallback)"""
+    with METRICS.span("generate.optimize"):
+        optimization = optimize_portions_cached(ingredients, max_calories, target_nutrient)
+    return OptimizationResult.from_dict(optimization, target_nutrient, max_calories)
+
+@timed("generate")
+def generate_recipes(ingredients: List[Ingredient], max_calories: float,
+                     target_nutrient: str) -> GenerationResult:
+    """Search recipes for the ingredients and optimize portions for each one"""
+    result = GenerationResult(list(ingredients), max_calories, target_nutrient)
+    ingredient_names = [ing.name for ing in ingredients]
+    with deadline_budget(GENERATION_DEADLINE_SECONDS):
+        recipes = search_recipes_by_ingredients(ingredient_names, target_nutrient)
+    
+    if not recipes:
+        result.custom = custom_optimization(ingredients, max_calories, target_nutrient)
+        return result
+    
+    for recipe in recipes:
+        with METRICS.span("generate.optimize"):
+            optimization = optimize_for_recipe(recipe, ingredients, max_calories, target_nutrient)
+        result.recipes.append(RecipeSuggestion(
+            recipe, OptimizationResult.from_dict(optimization, target_nutrient, max_calories)))
+    return result
+
+def iter_generate_recipes(ingredients: List[Ingredient], max_calories: float,
+                          target_nutrient: str):
+    """Streaming generate_recipes: yield each RecipeSuggestion as soon as it is ready.
+    
+    The stream ends with a GenerationResult holding the final ranking
+    (see iter_recipes_by_ingredients). If no recipe is found, a single
+    OptimizationResult for the custom fallback is yielded instead.
+    """
+    suggestions = {}
+    ingredient_names = [ing.name for ing in ingredients]
+    for item in iter_recipes_by_ingredients(ingredient_names, target_nutrient,
+                                            budget=GENERATION_DEADLINE_SECONDS):
+        if isinstance(item, RecipeRanking):
+            final = GenerationResult(list(ingredients), max_calories, target_nutrient)
+            for recipe in item.recipes:
+                optimization = suggestions[(recipe.title, recipe.ingredients)].optimization
+                final.recipes.append(RecipeSuggestion(recipe, optimization))
+            yield final
+            continue
+        with METRICS.span("generate.optimize"):
+            optimization = optimize_for_recipe(item, ingredients, max_calories, target_nutrient)
+        suggestion = RecipeSuggestion(
+            item, OptimizationResult.from_dict(optimization, target_nutrient, max_calories))
+        suggestions[(item.title, item.ingredients)] = suggestion
+        yield suggestion
+    if not suggestions:
+        yield custom_optimization(ingredients, max_calories, target_nutrient)
+
+# ========================
+# Text Rendering (shared by GUI and CLI)
+# ========================
+@timed("generate.render")
+def render_generation(result: GenerationResult) -> str:
+    """Format a GenerationResult as the recipe report text"""
+    output = []
+    output.append("=" * 60)
+    output.append("🧠 SMART NUTRITIONAL RECIPE GENERATOR")
+    output.append("=" * 60)
+    
+    if result.custom is not None:
+        output.append("❌ No recipes found. Generating custom optimization...")
+        output.extend(render_custom_optimization(result.ingredients, result.custom))
+        return "\n".join(output)
+    
+    output.append(f"\n🍽️ FOUND {len(result.recipes)} RECIPES FOR YOUR INGREDIENTS:")
+    for i, suggestion in enumerate(result.recipes, 1):
+        output.extend(render_recipe(suggestion, i, len(result.recipes), len(result.ingredients)))
+    
+    return "\n".join(output)
+
+def stream_generation(ingredients: List[Ingredient], max_calories: float,
+                      target_nutrient: str):
+    """Yield the recipe report in chunks as each recipe becomes available"""
+    yield "\n".join(["=" * 60, "🧠 SMART NUTRITIONAL RECIPE GENERATOR", "=" * 60])
+    count = 0
+    for item in iter_generate_recipes(ingredients, max_calories, target_nutrient):
+        if isinstance(item, OptimizationResult):
+            yield "\n".join(["❌ No recipes found. Generating custom optimization..."] +
+                            render_custom_optimization(ingredients, item))
+            return
+        if isinstance(item, GenerationResult):
+            ranking = render_ranking(item)
+            if ranking:
+                yield "\n".join(ranking)
+            continue
+        count += 1
+        lines = ["\n🍽️ RECIPES FOR YOUR INGREDIENTS:"] if count == 1 else []
+        with METRICS.span("generate.render"):
+            lines.extend(render_recipe(item, count, None, len(ingredients),
+                                       separator_before=count > 1))
+        yield "\n".join(lines)
+    yield f"\n✅ Found {count} recipes"
+
+def render_ranking(result: GenerationResult) -> List[str]:
+    """Format the final ranking that closes a streamed report"""
+    if len(result.recipes) < 2:
+        return []
+    output = [f"\n{'=' * 50}", "🏆 FINAL RANKING:"]
+    for i, suggestion in enumerate(result.recipes, 1):
+        optimization = suggestion.optimization
+        output.append(f" {i}. {suggestion.recipe.title} (match {suggestion.recipe.nutrition_score:.2f}, "
+                      f"{optimization.target_amount:.1f}g {optimization.target_nutrient})")
+    return output
+
+def render_recipe(suggestion: RecipeSuggestion, i: int, recipe_count: Optional[int],
+                  ingredient_count: int, separator_before: bool = False) -> List[str]:
+    """Format one recipe block (#i of recipe_count)
+    
+    Blocks are separated by a rule after every block but the last; when
+    streaming, the total isn't known yet, so pass recipe_count=None and
+    separator_before=True for every block after the first instead.
+    """
+    recipe = suggestion.recipe
+    optimization = suggestion.optimization
+    target_nutrient = optimization.target_nutrient
+    max_calories = optimization.max_calories
+    
+    output = []
+    if separator_before:
+        output.append(f"\n{'_' * 50}")
+    output.append(f"\n{'=' * 50}")
+    output.append(f"📖 RECIPE #{i}: {recipe.title}")
+    output.append(f"👥 Servings: {recipe.servings}")
+    output.append(f"⭐ Ingredient Match Score: {recipe.nutrition_score:.2f} (BM25, {ingredient_count} ingredients)")
+    output.append('=' * 50)
+    
+    output.append(f"\n📋 OPTIMIZED INGREDIENTS (for max {target_nutrient.upper()}):")
+    total_weight = 0
+    for ing_name, quantity in optimization.portions.items():
+        output.append(f" • {ing_name.title()}: {quantity:.0f}g")
+        total_weight += quantity
+    if not optimization.portions:
+        output.append(" • None of your ingredients appear in this recipe")
+    
+    output.append(f"\n📊 COMPLETE NUTRITIONAL BREAKDOWN:")
+    output.append(f" 🔥 Total Calories: {optimization.total_calories:.0f}")
+    output.append(f" 💪 Protein: {optimization.total_protein:.1f}g ({optimization.macros_breakdown['protein_percent']:.1f}%)")
+    output.append(f" 🍞 Carbs: {optimization.total_carbs:.1f}g ({optimization.macros_breakdown['carbs_percent']:.1f}%)")
+    output.append(f" 🥑 Fat: {optimization.total_fat:.1f}g ({optimization.macros_breakdown['fat_percent']:.1f}%)")
+    output.append(f" ⚖️ Total Weight: {total_weight:.0f}g")
+    output.append(f" 🎯 Target {target_nutrient.title()}: {optimization.target_amount:.1f}g")
+    
+    output.append(f"\n🛒 ORIGINAL RECIPE INGREDIENTS:")
+    # Clean and display original ingredients
+    orig_ingredients = recipe.ingredients.replace("|", "\n • ").strip()
+    if orig_ingredients:
+        output.append(f" • {orig_ingredients}")
+    else:
+        output.append(" • (No ingredient list provided)")
+    
+    output.append(f"\n👨‍🍳 COOKING INSTRUCTIONS:")
+    # Clean and format instructions
+    if recipe.instructions:
+        instructions = recipe.instructions.replace(". ", ".\n").strip()
+        # Split into steps and number them
+        sentences = [s.strip() for s in instructions.split('\n') if s.strip()]
+        for j, step in enumerate(sentences, 1):
+            output.append(f" {j}. {step}")
+    else:
+        output.append(" • (No instructions provided)")
+    
+    output.append(f"\n💡 OPTIMIZATION TIPS:")
+    output.append(f" • Adjust ingredient ratios to match the optimized portions above")
+    output.append(f" • This maximizes your {target_nutrient} intake within {max_calories} calories")
+    if target_nutrient == "protein":
+        output.append(" • Consider cooking methods that preserve protein (grilling, baking)")
+    elif target_nutrient == "carbs":
+        output.append(" • Pair with healthy fats for better satiety")
+    elif target_nutrient == "fat":
+        output.append(" • Use healthy fats like olive oil, avocado, or nuts")
+    
+    if recipe_count is not None and i < recipe_count:
+        output.append(f"\n{'_' * 50}")
     
-    # Vegetables
-    "broccoli": {"calories": 0.34, "protein": 0.028, "carbs": 0.07, "fat": 0.004},
-    "spinach": {"calories": 0.23, "protein": 0.029, "carbs": 0.036, "fat": 0.004},
-    "kale": {"calories": 0.43, "protein": 0.029, "carbs": 0.10, "fat": 0.007},
-    "carrots": {"calories": 0.41, "protein": 0.009, "carbs": 0.096, "fat": 0.002},
-    "bell pepper": {"calories": 0.26, "protein": 0.008, "carbs": 0.061, "fat": 0.002},
-    "tomato": {"calories": 0.18, "protein": 0.009, "carbs": 0.039, "fat": 0.002},
-    "onion": {"calories": 0.40, "protein": 0.011, "carbs": 0.093, "fat": 0.001},
-    "garlic": {"calories": 1.49, "protein": 0.064, "carbs": 0.331, "fat": 0.005},
+    return output
+
+def render_custom_optimization(ingredients: List[Ingredient],
+                               optimization: OptimizationResult) -> List[str]:
+    """Format the custom (no recipe) optimization with a basic preparation guide"""
+    target_nutrient = optimization.target_nutrient
     
-    # Fruits
-    "banana": {"calories": 0.89, "protein": 0.011, "carbs": 0.23, "fat": 0.003},
-    "apple": {"calories": 0.52, "protein": 0.003, "carbs": 0.14, "fat": 0.002},
-    "orange": {"calories": 0.43, "protein": 0.009, "carbs": 0.087, "fat": 0.001},
-    "berries": {"calories": 0.43, "protein": 0.005, "carbs": 0.096, "fat": 0.003},
+    output = []
+    output.append(f"\n🥗 CUSTOM OPTIMIZED RECIPE:")
+    output.append(f"📋 INGREDIENTS:")
+    total_weight = 0
+    for ing, qty in optimization.portions.items():
+        output.append(f" • {ing.title()}: {qty:.0f}g")
+        total_weight += qty
     
-    # Dairy & Others
-    "milk": {"calories": 0.42, "protein": 0.034, "carbs": 0.05, "fat": 0.01},
-    "greek yogurt": {"calories": 0.97, "protein": 0.17, "carbs": 0.061, "fat": 0.052},
-    "cheese": {"calories": 4.02, "protein": 0.25, "carbs": 0.024, "fat": 0.33},
-    "olive oil": {"calories": 8.84, "protein": 0.0, "carbs": 0.0, "fat": 1.0},
-    "avocado": {"calories": 1.67, "protein": 0.020, "carbs": 0.017, "fat": 0.147},
-    "nuts": {"calories": 6.07, "protein": 0.206, "carbs": 0.207, "fat": 0.540}
-}
+    output.append(f"\n📊 COMPLETE NUTRITION:")
+    output.append(f" 🔥 Calories: {optimization.total_calories:.0f}")
+    output.append(f" 💪 Protein: {optimization.total_protein:.1f}g")
+    output.append(f" 🍞 Carbs: {optimization.total_carbs:.1f}g")
+    output.append(f" 🥑 Fat: {optimization.total_fat:.1f}g")
+    output.append(f" ⚖️ Total Weight: {total_weight:.0f}g")
+    output.append(f" 🎯 Target {target_nutrient.title()}: {optimization.target_amount:.1f}g")
+    
+    output.append(f"\n👨‍🍳 BASIC PREPARATION GUIDE:")
+    output.append(" 1. Prepare all ingredients by washing and chopping as needed")
+    
+    # Add specific cooking suggestions based on ingredients
+    has_protein = any(ing for ing in ingredients if ing.protein > 0.15)
+    has_vegetables = any(ing for ing in ingredients if ing.name.lower() in 
+                        ['broccoli', 'spinach', 'carrots', 'bell pepper', 'kale'])
+    
+    if has_protein:
+        output.append(" 2. Cook proteins first using your preferred method (grill, bake, or sauté)")
+    if has_vegetables:
+        output.append(" 3. Steam or sauté vegetables until tender-crisp")
+    
+    output.append(" 4. Combine ingredients according to your preference")
+    output.append(" 5. Season to taste with salt, pepper, herbs, and spices")
+    output.append(" 6. Serve immediately while hot")
+    
+    return output
 
 # ========================
-# Enhanced API Functions
+# Background Jobs
 # ========================
-def rate_limit():
-    """Simple rate limiting to avoid API abuse"""
-    global LAST_REQUEST_TIME
-    current_time = time.time()
-    time_since_last = current_time - LAST_REQUEST_TIME
-    if time_since_last < MIN_REQUEST_INTERVAL:
-        time.sleep(MIN_REQUEST_INTERVAL - time_since_last)
-    LAST_REQUEST_TIME = time.time()
+class JobCancelled(Exception):
+    """Raised inside a job when its cancellation token has been triggered"""
 
-def test_api_connection():
-    """Test if API Ninjas is working"""
-    if not API_NINJAS_KEY or API_NINJAS_KEY == "your_api_key_here":
-        return False, "API key not set"
+class CancelToken:
+    """Cooperative cancellation flag checked by jobs between API calls"""
     
-    try:
-        rate_limit()
-        response = requests.get(NUTRITION_API_URL, 
-                              headers=HEADERS, 
-                              params={"query": "apple"},
-                              timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
-            if data:
-                return True, "API working"
-            else:
-                return True, "API working (empty response)"
-        elif response.status_code == 401:
-            return False, "Invalid API key - check your key"
-        elif response.status_code == 429:
-            return False, "Rate limit exceeded - try again later"
-        elif response.status_code == 400:
-            return False, f"Bad request - API key format issue"
-        else:
-            return False, f"API error {response.status_code}"
-    except Exception as e:
-        return False, f"Connection error: {e}"
-
-def clean_food_name(food_name: str) -> str:
-    """Clean and normalize food name for better API results"""
-    cleaned = re.sub(r'\s+', ' ', food_name.lower().strip())
-    cooking_terms = ['cooked', 'raw', 'fresh', 'frozen', 'canned', 'dried']
-    for term in cooking_terms:
-        cleaned = re.sub(rf'\b{term}\b', '', cleaned).strip()
-    cleaned = re.sub(r'\b\d+\s*(g|kg|oz|lb|pounds?|grams?)\b', '', cleaned).strip()
-    return cleaned
-
-def fetch_nutrition_api(food_name: str) -> Dict[str, float]:
-    """Get nutrition info from API Ninjas or fallback database"""
-    cleaned_name = clean_food_name(food_name)
+    def __init__(self):
+        self._event = threading.Event()
     
-    if cleaned_name in NUTRITION_DB:
-        return NUTRITION_DB[cleaned_name]
+    def cancel(self):
+        self._event.set()
     
-    for db_food in NUTRITION_DB:
-        if db_food in cleaned_name or cleaned_name in db_food:
-            return NUTRITION_DB[db_food]
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
     
-    try:
-        rate_limit()
-        response = requests.get(NUTRITION_API_URL, 
-                              headers=HEADERS, 
-                              params={"query": cleaned_name},
-                              timeout=15)
-        
-        if response.status_code != 200:
-            raise ValueError(f"API error {response.status_code}: {response.text}")
-        
-        data = response.json()
-        
-        if not data or len(data) == 0:
-            raise ValueError(f"No nutrition data found for '{cleaned_name}'")
-        
-        item = data[0]
-        
-        nutrition = {
-            "calories": float(item.get("calories", 0)) / 100.0,
-            "protein": float(item.get("protein_g", 0)) / 100.0,
-            "carbs": float(item.get("carbohydrates_total_g", 0)) / 100.0,
-            "fat": float(item.get("fat_total_g", 0)) / 100.0,
-        }
-        
-        return nutrition
-        
-    except Exception as e:
-        raise ValueError(f"API lookup failed for '{food_name}': {e}")
+    def check(self):
+        """Raise JobCancelled if the job should stop"""
+        if self._event.is_set():
+            raise JobCancelled()
 
-def search_recipes_by_ingredients(ingredient_list: List[str], target_nutrient: str) -> List[Recipe]:
-    """Search for recipes using the ingredients and rank by nutritional value"""
-    queries = []
+class Job:
+    """Handle passed to a running job: cancellation checks and progress reporting"""
     
-    if len(ingredient_list) > 0:
-        queries.append(ingredient_list[0])
+    def __init__(self, scheduler: "JobScheduler", key: str, on_progress=None):
+        self.scheduler = scheduler
+        self.key = key
+        self.token = CancelToken()
+        self.on_progress = on_progress
+        self.future = None
     
-    if len(ingredient_list) > 1:
-        queries.append(f"{ingredient_list[0]} {ingredient_list[1]}")
+    @property
+    def cancelled(self) -> bool:
+        return self.token.cancelled
     
-    if len(ingredient_list) <= 3:
-        queries.append(" ".join(ingredient_list))
+    def check(self):
+        self.token.check()
     
-    queries.append(f"healthy {ingredient_list[0]}")
-    if target_nutrient == "protein":
-        queries.append(f"high protein {ingredient_list[0]}")
-    elif target_nutrient == "carbs":
-        queries.append(f"carb rich {ingredient_list[0]}")
+    def cancel(self):
+        self.token.cancel()
     
-    all_recipes = []
+    def progress(self, *args):
+        """Deliver a progress update via the scheduler's dispatcher (dropped once cancelled)"""
+        self.token.check()
+        if self.on_progress is not None:
+            self.scheduler._dispatch(self, self.on_progress, *args)
+
+class JobScheduler:
+    """Bounded worker pool with per-key deduplication and cancellable jobs.
+    
+    Callbacks (progress, done, error) run through ``dispatch``, e.g.
+    ``lambda fn: root.after(0, fn)`` to marshal them onto the Tk main loop.
+    """
+    
+    def __init__(self, max_workers: int = JOB_MAX_WORKERS, dispatch=None):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.dispatch = dispatch or (lambda fn: fn())
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+    
+    def submit(self, key: str, func, *args, on_progress=None, on_done=None, on_error=None,
+               on_finally=None, restart: bool = False) -> Job:
+        """Run ``func(job, *args)`` in the pool unless a job with ``key`` is already running.
+        
+        A duplicate submission returns the running job; ``restart=True`` cancels
+        it instead and starts a fresh one (used for stale generations).
+        """
+        with self._lock:
+            running = self._jobs.get(key)
+            if running is not None:
+                if not restart:
+                    return running
+                running.cancel()
+            job = Job(self, key, on_progress)
+            self._jobs[key] = job
+        job.future = self.executor.submit(self._run, job, func, args, on_done, on_error, on_finally)
+        return job
     
-    for query in queries[:5]:
+    def _run(self, job: Job, func, args, on_done, on_error, on_finally):
         try:
-            rate_limit()
-            response = requests.get(RECIPE_API_URL,
-                                  headers=HEADERS,
-                                  params={"query": query},
-                                  timeout=15)
-            
-            if response.status_code == 200:
-                recipes_data = response.json()
-                for recipe_data in recipes_data:
-                    recipe = Recipe(
-                        title=recipe_data.get("title", "Unknown Recipe"),
-                        ingredients=recipe_data.get("ingredients", ""),
-                        instructions=recipe_data.get("instructions", ""),
-                        servings=recipe_data.get("servings", "Unknown servings")
-                    )
-                    all_recipes.append(recipe)
-                
+            job.check()
+            result = func(job, *args)
+            job.check()
+        except JobCancelled:
+            pass
         except Exception as e:
-            continue
+            if on_error is not None:
+                self._dispatch(job, on_error, e)
+        else:
+            if on_done is not None:
+                self._dispatch(job, on_done, result)
+        finally:
+            with self._lock:
+                if self._jobs.get(job.key) is job:
+                    del self._jobs[job.key]
+            if on_finally is not None:
+                self.dispatch(on_finally)
     
-    unique_recipes = []
-    seen_titles = set()
+    def _dispatch(self, job: Job, callback, *args):
+        """Hand a callback to the dispatcher, skipping it if the job was cancelled meanwhile"""
+        def deliver():
+            if not job.cancelled:
+                callback(*args)
+        self.dispatch(deliver)
     
-    for recipe in all_recipes:
-        if recipe.title.lower() not in seen_titles:
-            seen_titles.add(recipe.title.lower())
-            
-            score = 0
-            recipe_text = (recipe.ingredients + " " + recipe.instructions).lower()
-            
-            for ingredient in ingredient_list:
-                ingredient_clean = clean_food_name(ingredient)
-                if ingredient_clean in recipe_text or ingredient.lower() in recipe_text:
-                    score += 1
-            
-            for ingredient in ingredient_list:
-                if ingredient.lower() in recipe_text:
-                    score += 0.5
-            
-            recipe.nutrition_score = score
-            unique_recipes.append(recipe)
+    def is_running(self, key: str) -> bool:
+        with self._lock:
+            return key in self._jobs
     
-    unique_recipes.sort(key=lambda r: r.nutrition_score, reverse=True)
-    return unique_recipes[:5]
-
-def optimize_recipe_portions(recipe: Recipe, ingredients: List[Ingredient], 
-                           max_calories: float, target_nutrient: str) -> Dict:
-    """Optimize ingredient portions within the recipe context"""
-    sorted_ingredients = sorted(ingredients, 
-                               key=lambda ing: ing.nutritional_score(target_nutrient), 
-                               reverse=True)
-    
-    optimized_portions = {}
-    total_calories = 0.0
-    total_target_nutrient = 0.0
-    total_protein = 0.0
-    total_carbs = 0.0
-    total_fat = 0.0
-    
-    for ing in sorted_ingredients:
-        if total_calories >= max_calories:
-            break
-        if ing.calories <= 0:
-            continue
-        
-        remaining_calories = max_calories - total_calories
-        max_qty_by_calories = remaining_calories / ing.calories
-        qty_to_use = min(ing.quantity, max_qty_by_calories)
-        
-        if qty_to_use <= 0:
-            continue
-        
-        optimized_portions[ing.name] = qty_to_use
-        calories_added = qty_to_use * ing.calories
-        total_calories += calories_added
-        total_target_nutrient += qty_to_use * getattr(ing, target_nutrient)
-        total_protein += qty_to_use * ing.protein
-        total_carbs += qty_to_use * ing.carbs
-        total_fat += qty_to_use * ing.fat
+    def cancel(self, key: str) -> bool:
+        """Cancel the running job for ``key``; returns False if there was none"""
+        with self._lock:
+            job = self._jobs.pop(key, None)
+        if job is None:
+            return False
+        job.cancel()
+        return True
     
-    return {
-        "portions": optimized_portions,
-        "total_calories": total_calories,
-        f"total_{target_nutrient}": total_target_nutrient,
-        "total_protein": total_protein,
-        "total_carbs": total_carbs,
-        "total_fat": total_fat,
-        "macros_breakdown": {
-            "protein_percent": (total_protein * 4 / total_calories * 100) if total_calories > 0 else 0,
-            "carbs_percent": (total_carbs * 4 / total_calories * 100) if total_calories > 0 else 0,
-            "fat_percent": (total_fat * 9 / total_calories * 100) if total_calories > 0 else 0
-        }
-    }
+    def cancel_all(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+            self._jobs.clear()
+        for job in jobs:
+            job.cancel()
+    
+    def shutdown(self):
+        self.cancel_all()
+        self.executor.shutdown(wait=False)
 
 # ========================
 # GUI Application
 # ========================
+def _load_tkinter():
+    """Import tkinter on demand so the core API works headless"""
+    global tk, ttk, messagebox, scrolledtext
+    import tkinter as tk
+    from tkinter import ttk, messagebox, scrolledtext
+
 class RecipeGeneratorGUI:
     def __init__(self, root):
         self.root = root
@@ -316,6 +3270,8 @@ class RecipeGeneratorGUI:
         
         # Data storage
         self.ingredients = []
+        self.portion_index = GreedyIndexCache()  # kept in sync with self.ingredients
+        self.jobs = JobScheduler(dispatch=lambda fn: self.root.after(0, fn))
         
         # Create main notebook for tabs
         self.notebook = ttk.Notebook(root)
@@ -430,6 +3386,11 @@ class RecipeGeneratorGUI:
         clear_btn = ttk.Button(button_frame, text="🗑️ Clear All",
                              command=self.clear_ingredients, width=15)  # Set fixed width
         clear_btn.pack(side='left')
+        
+        # Import shopping list button
+        import_btn = ttk.Button(button_frame, text="📂 Import List",
+                              command=self.import_ingredient_list, width=15)
+        import_btn.pack(side='left', padx=(10, 0))
     
     def create_recipe_tab(self):
         """Create the recipe generation tab"""
@@ -446,12 +3407,28 @@ class RecipeGeneratorGUI:
         self.max_calories_entry.grid(row=0, column=1, padx=5, pady=5)
         self.max_calories_entry.insert(0, "500")  # Default value
         
+        # Calorie slider with live preview of the best achievable target
+        self.calorie_slider = ttk.Scale(config_frame, from_=100, to=3000, orient='horizontal',
+                                        length=200, command=self.preview_calorie_cap)
+        self.calorie_slider.grid(row=0, column=2, padx=10, pady=5)
+        self.preview_label = tk.Label(config_frame, text="", font=('Arial', 9), fg='#7f8c8d')
+        self.preview_label.grid(row=1, column=2, padx=10, pady=5, sticky='w')
+        
+        # Protein/carbs/fat vs calories frontier; click to pick a cap
+        self.frontier_canvas = tk.Canvas(config_frame, width=FRONTIER_PLOT_WIDTH,
+                                         height=FRONTIER_PLOT_HEIGHT, bg='white',
+                                         highlightthickness=1, highlightbackground='#bdc3c7')
+        self.frontier_canvas.grid(row=0, column=3, rowspan=3, padx=10, pady=5)
+        self.frontier_canvas.bind('<Button-1>', self.pick_frontier_point)
+        self.calorie_slider.set(500)
+        
         # Target nutrient
         tk.Label(config_frame, text="Maximize:").grid(row=1, column=0, sticky='w', pady=5)
         self.target_nutrient = ttk.Combobox(config_frame, values=['protein', 'carbs', 'fat'], 
                                           state='readonly', width=12)
         self.target_nutrient.grid(row=1, column=1, padx=5, pady=5)
         self.target_nutrient.set('protein')  # Default value
+        self.target_nutrient.bind('<<ComboboxSelected>>', lambda e: self.update_calorie_preview())
         
         # Generate button - using Accent style for visibility
         self.generate_btn = ttk.Button(config_frame, text="🚀 Generate Smart Recipes",
@@ -482,14 +3459,18 @@ class RecipeGeneratorGUI:
     
     def test_api_status(self):
         """Test API connection and update status"""
-        def test_in_thread():
-            working, status = test_api_connection()
+        def show_status(outcome):
+            working, status = outcome
             if working:
                 self.api_status_label.config(text=f"✅ API Status: {status}", fg='#27ae60')
             else:
                 self.api_status_label.config(text=f"⚠️ API Status: {status}", fg='#e74c3c')
         
-        threading.Thread(target=test_in_thread, daemon=True).start()
+        cached = cached_api_health()
+        if cached is not None:
+            show_status(cached)
+            return
+        self.jobs.submit("api-status", lambda job: probe_api_health(), on_done=show_status)
     
     def auto_fill_nutrition(self):
         """Auto-fill nutrition data from API or database"""
@@ -498,21 +3479,17 @@ class RecipeGeneratorGUI:
             messagebox.showwarning("Warning", "Please enter an ingredient name first.")
             return
         
-        def fetch_in_thread():
-            try:
-                self.auto_fill_btn.config(state='disabled', text='🔍 Fetching...')
-                nutrition = fetch_nutrition_api(name)
-                
-                # Update GUI in main thread
-                self.root.after(0, lambda: self.update_nutrition_fields(nutrition, True))
-                
-            except Exception as e:
-                error_msg = f"Could not fetch nutrition data: {e}"
-                self.root.after(0, lambda: messagebox.showwarning("Auto-fill Failed", error_msg))
-            finally:
-                self.root.after(0, lambda: self.auto_fill_btn.config(state='normal', text='🔍 Auto-Fill Nutrition'))
-        
-        threading.Thread(target=fetch_in_thread, daemon=True).start()
+        # Repeated clicks for the same food join the lookup already in flight
+        key = f"autofill:{clean_food_name(name)}"
+        if self.jobs.is_running(key):
+            return
+        self.auto_fill_btn.config(state='disabled', text='🔍 Fetching...')
+        self.jobs.submit(
+            key, lambda job: fetch_nutrition_api(name),
+            on_done=lambda nutrition: self.update_nutrition_fields(nutrition, True),
+            on_error=lambda e: messagebox.showwarning("Auto-fill Failed", f"Could not fetch nutrition data: {e}"),
+            on_finally=lambda: self.auto_fill_btn.config(state='normal', text='🔍 Auto-Fill Nutrition'),
+        )
     
     def update_nutrition_fields(self, nutrition, success=True):
         """Update nutrition entry fields"""
@@ -549,13 +3526,7 @@ class RecipeGeneratorGUI:
             
             # Create ingredient
             ingredient = Ingredient(name, quantity, calories, protein, carbs, fat)
-            self.ingredients.append(ingredient)
-            
-            # Add to treeview
-            self.ingredients_tree.insert('', 'end', values=(
-                name, f"{quantity:.0f}", f"{calories:.3f}", 
-                f"{protein:.3f}", f"{carbs:.3f}", f"{fat:.3f}"
-            ))
+            self.append_ingredient(ingredient)
             
             # Clear entries
             self.name_entry.delete(0, tk.END)
@@ -570,6 +3541,60 @@ class RecipeGeneratorGUI:
         except ValueError:
             messagebox.showerror("Error", "Please enter valid numbers for all fields.")
     
+    def append_ingredient(self, ingredient: Ingredient):
+        """Add an ingredient to the data, the prefix index and the treeview"""
+        self.ingredients.append(ingredient)
+        self.portion_index.add(ingredient)
+        self.update_calorie_preview()
+        
+        # Add to treeview
+        self.ingredients_tree.insert('', 'end', values=(
+            ingredient.name, f"{ingredient.quantity:.0f}", f"{ingredient.calories:.3f}", 
+            f"{ingredient.protein:.3f}", f"{ingredient.carbs:.3f}", f"{ingredient.fat:.3f}"
+        ))
+    
+    def import_ingredient_list(self):
+        """Import a shopping list file ("name[, grams]" per line) with bulk nutrition lookup"""
+        from tkinter import filedialog
+        filename = filedialog.askopenfilename(
+            filetypes=[("Text files", "*.txt"), ("CSV files", "*.csv"), ("All files", "*.*")],
+            title="Import Ingredient List"
+        )
+        if not filename:
+            return
+        try:
+            with open(filename, encoding='utf-8') as f:
+                items = parse_shopping_list(f.read())
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to read list: {e}")
+            return
+        
+        def resolve_in_thread(job):
+            quantities: Dict[str, List[float]] = {}
+            for name, grams in items:
+                quantities.setdefault(name, []).append(grams)
+            failed = []
+            for name, nutrition, error in resolve_nutrition_bulk([name for name, _ in items]):
+                job.check()
+                grams = quantities[name].pop(0)
+                if nutrition is None:
+                    failed.append(name)
+                    continue
+                job.progress(Ingredient(name, grams, nutrition["calories"], nutrition["protein"],
+                                        nutrition["carbs"], nutrition["fat"]))
+            
+            summary = f"Imported {len(items) - len(failed)} of {len(items)} ingredients."
+            if failed:
+                summary += "\n\nNo nutrition data for: " + ", ".join(failed[:20])
+            return summary
+        
+        self.jobs.submit(
+            f"import:{filename}", resolve_in_thread,
+            on_progress=self.append_ingredient,
+            on_done=lambda summary: messagebox.showinfo("Import Complete", summary),
+            on_error=lambda e: messagebox.showerror("Error", f"Import failed: {e}"),
+        )
+    
     def remove_ingredient(self):
         """Remove selected ingredient"""
         selected = self.ingredients_tree.selection()
@@ -583,7 +3608,10 @@ class RecipeGeneratorGUI:
         
         # Remove from data and treeview
         del self.ingredients[index]
+        self.portion_index.remove(index)
+        self.jobs.cancel("generate")
         self.ingredients_tree.delete(item)
+        self.update_calorie_preview()
         
         messagebox.showinfo("Success", "Ingredient removed!")
     
@@ -592,10 +3620,64 @@ class RecipeGeneratorGUI:
         if self.ingredients:
             if messagebox.askyesno("Confirm", "Clear all ingredients?"):
                 self.ingredients.clear()
+                self.portion_index.clear()
+                self.jobs.cancel("generate")
+                self.update_calorie_preview()
                 for item in self.ingredients_tree.get_children():
                     self.ingredients_tree.delete(item)
                 messagebox.showinfo("Success", "All ingredients cleared!")
     
+    def preview_calorie_cap(self, value=None):
+        """Copy the slider value into the calorie entry and refresh the preview"""
+        self.max_calories_entry.delete(0, tk.END)
+        self.max_calories_entry.insert(0, f"{float(self.calorie_slider.get()):.0f}")
+        self.update_calorie_preview()
+    
+    def update_calorie_preview(self):
+        """Show the best target amount at the current cap (prefix-index lookup, no re-sort)"""
+        if not self.ingredients:
+            self.preview_label.config(text="Add ingredients to preview")
+            self.frontier_canvas.delete('all')
+            return
+        try:
+            max_calories = float(self.max_calories_entry.get())
+        except ValueError:
+            return
+        target_nutrient = self.target_nutrient.get()
+        totals = self.portion_index.totals_at(max_calories, target_nutrient)
+        self.preview_label.config(
+            text=f"Up to {totals[target_nutrient]:.1f}g {target_nutrient} "
+                 f"in {totals['calories']:.0f} kcal")
+        self.draw_frontier(max_calories, target_nutrient)
+    
+    def draw_frontier(self, max_calories: float, target_nutrient: str):
+        """Plot the target-vs-calories frontier over the slider range, marking the cap"""
+        canvas = self.frontier_canvas
+        canvas.delete('all')
+        frontier = self.portion_index.frontier(target_nutrient)
+        x_max = float(self.calorie_slider.cget('to'))
+        costs = [c for c in frontier.costs if c < x_max] + [x_max]
+        values = frontier.value_at(costs)
+        y_max = max(float(values[-1]), 1e-9)
+        width, height, pad = FRONTIER_PLOT_WIDTH, FRONTIER_PLOT_HEIGHT, 6
+        
+        def to_xy(cost, value):
+            return (pad + (width - 2 * pad) * cost / x_max,
+                    height - pad - (height - 2 * pad) * value / y_max)
+        
+        points = [xy for c, v in zip(costs, values) for xy in to_xy(c, v)]
+        canvas.create_line(*points, fill='#27ae60', width=2)
+        x, y = to_xy(min(max_calories, x_max), float(frontier.value_at(max_calories)))
+        canvas.create_oval(x - 3, y - 3, x + 3, y + 3, fill='#e74c3c', outline='')
+        canvas.create_text(pad, pad, anchor='nw', font=('Arial', 7), fill='#7f8c8d',
+                           text=f"{target_nutrient} vs kcal")
+    
+    def pick_frontier_point(self, event):
+        """Move the calorie slider to the clicked point on the frontier"""
+        x_max = float(self.calorie_slider.cget('to'))
+        fraction = (event.x - 6) / (FRONTIER_PLOT_WIDTH - 12)
+        self.calorie_slider.set(min(max(fraction, 0.0), 1.0) * x_max)
+    
     def generate_recipes_threaded(self):
         """Generate recipes in a separate thread"""
         if not self.ingredients:
@@ -611,177 +3693,39 @@ class RecipeGeneratorGUI:
             return
         
         target_nutrient = self.target_nutrient.get()
+        ingredients = list(self.ingredients)
         
-        def generate_in_thread():
-            try:
-                # Start progress bar
-                self.root.after(0, lambda: self.progress.start())
-                self.root.after(0, lambda: self.generate_btn.config(state='disabled'))
-                
-                # Generate recipes
-                output = self.generate_smart_recipe(self.ingredients, max_calories, target_nutrient)
-                
-                # Update results in main thread
-                self.root.after(0, lambda: self.update_results(output))
-                
-            except Exception as e:
-                error_msg = f"Recipe generation failed: {e}"
-                self.root.after(0, lambda: messagebox.showerror("Error", error_msg))
-            finally:
-                # Stop progress bar and re-enable button
-                self.root.after(0, lambda: self.progress.stop())
-                self.root.after(0, lambda: self.generate_btn.config(state='normal'))
+        def generate_in_thread(job):
+            # Stream recipes into the results area as each one is ready;
+            # every chunk follows an API call, so a stale run stops here
+            for chunk in stream_generation(ingredients, max_calories, target_nutrient):
+                job.progress(chunk)
+        
+        def finished():
+            if not self.jobs.is_running("generate"):
+                self.progress.stop()
         
-        threading.Thread(target=generate_in_thread, daemon=True).start()
+        # Clicking again with new inputs cancels the stale generation
+        self.update_results("")
+        if not self.jobs.is_running("generate"):
+            self.progress.start()
+        self.jobs.submit(
+            "generate", generate_in_thread,
+            on_progress=self.append_results,
+            on_error=lambda e: messagebox.showerror("Error", f"Recipe generation failed: {e}"),
+            on_finally=finished, restart=True,
+        )
     
     def generate_smart_recipe(self, ingredients: List[Ingredient], max_calories: float, 
                              target_nutrient: str) -> str:
         """Generate optimized recipes and return formatted output"""
-        
-        ingredient_names = [ing.name for ing in ingredients]
-        
-        output = []
-        output.append("=" * 60)
-        output.append("🧠 SMART NUTRITIONAL RECIPE GENERATOR")
-        output.append("=" * 60)
-        
-        # Search for real recipes
-        recipes = search_recipes_by_ingredients(ingredient_names, target_nutrient)
-        
-        if not recipes:
-            output.append("❌ No recipes found. Generating custom optimization...")
-            custom_output = self.display_custom_optimization(ingredients, max_calories, target_nutrient)
-            output.extend(custom_output)
-            return "\n".join(output)
-        
-        # Display found recipes with optimized portions
-        output.append(f"\n🍽️ FOUND {len(recipes)} RECIPES FOR YOUR INGREDIENTS:")
-        
-        for i, recipe in enumerate(recipes, 1):
-            output.append(f"\n{'=' * 50}")
-            output.append(f"📖 RECIPE #{i}: {recipe.title}")
-            output.append(f"👥 Servings: {recipe.servings}")
-            output.append(f"⭐ Ingredient Match Score: {recipe.nutrition_score:.1f}/{len(ingredient_names)}")
-            output.append('=' * 50)
-            
-            # Optimize portions for this recipe
-            optimization = optimize_recipe_portions(recipe, ingredients, max_calories, target_nutrient)
-            
-            output.append(f"\n📋 OPTIMIZED INGREDIENTS (for max {target_nutrient.upper()}):")
-            total_weight = 0
-            for ing_name, quantity in optimization["portions"].items():
-                output.append(f" • {ing_name.title()}: {quantity:.0f}g")
-                total_weight += quantity
-            
-            output.append(f"\n📊 COMPLETE NUTRITIONAL BREAKDOWN:")
-            output.append(f" 🔥 Total Calories: {optimization['total_calories']:.0f}")
-            output.append(f" 💪 Protein: {optimization['total_protein']:.1f}g ({optimization['macros_breakdown']['protein_percent']:.1f}%)")
-            output.append(f" 🍞 Carbs: {optimization['total_carbs']:.1f}g ({optimization['macros_breakdown']['carbs_percent']:.1f}%)")
-            output.append(f" 🥑 Fat: {optimization['total_fat']:.1f}g ({optimization['macros_breakdown']['fat_percent']:.1f}%)")
-            output.append(f" ⚖️ Total Weight: {total_weight:.0f}g")
-            output.append(f" 🎯 Target {target_nutrient.title()}: {optimization[f'total_{target_nutrient}']:.1f}g")
-            
-            output.append(f"\n🛒 ORIGINAL RECIPE INGREDIENTS:")
-            # Clean and display original ingredients
-            orig_ingredients = recipe.ingredients.replace("|", "\n • ").strip()
-            if orig_ingredients:
-                output.append(f" • {orig_ingredients}")
-            else:
-                output.append(" • (No ingredient list provided)")
-            
-            output.append(f"\n👨‍🍳 COOKING INSTRUCTIONS:")
-            # Clean and format instructions
-            if recipe.instructions:
-                instructions = recipe.instructions.replace(". ", ".\n").strip()
-                # Split into steps and number them
-                sentences = [s.strip() for s in instructions.split('\n') if s.strip()]
-                for j, step in enumerate(sentences, 1):
-                    output.append(f" {j}. {step}")
-            else:
-                output.append(" • (No instructions provided)")
-            
-            output.append(f"\n💡 OPTIMIZATION TIPS:")
-            output.append(f" • Adjust ingredient ratios to match the optimized portions above")
-            output.append(f" • This maximizes your {target_nutrient} intake within {max_calories} calories")
-            if target_nutrient == "protein":
-                output.append(" • Consider cooking methods that preserve protein (grilling, baking)")
-            elif target_nutrient == "carbs":
-                output.append(" • Pair with healthy fats for better satiety")
-            elif target_nutrient == "fat":
-                output.append(" • Use healthy fats like olive oil, avocado, or nuts")
-            
-            if i < len(recipes):
-                output.append(f"\n{'_' * 50}")
-        
-        return "\n".join(output)
+        return render_generation(generate_recipes(ingredients, max_calories, target_nutrient))
     
     def display_custom_optimization(self, ingredients: List[Ingredient], max_calories: float, 
                                    target_nutrient: str) -> List[str]:
         """Enhanced fallback: Display custom optimization when no recipes found"""
-        sorted_ingredients = sorted(ingredients, 
-                                   key=lambda ing: ing.nutritional_score(target_nutrient), 
-                                   reverse=True)
-        
-        total_calories = 0.0
-        recipe = {}
-        total_protein = 0.0
-        total_carbs = 0.0
-        total_fat = 0.0
-        
-        for ing in sorted_ingredients:
-            if total_calories >= max_calories:
-                break
-            if ing.calories <= 0:
-                continue
-            
-            max_qty_by_calories = (max_calories - total_calories) / ing.calories
-            qty_to_use = min(ing.quantity, max_qty_by_calories)
-            if qty_to_use <= 0:
-                continue
-            
-            recipe[ing.name] = qty_to_use
-            total_calories += qty_to_use * ing.calories
-            total_protein += qty_to_use * ing.protein
-            total_carbs += qty_to_use * ing.carbs
-            total_fat += qty_to_use * ing.fat
-        
-        target_amount = total_protein if target_nutrient == "protein" else \
-                       total_carbs if target_nutrient == "carbs" else total_fat
-        
-        output = []
-        output.append(f"\n🥗 CUSTOM OPTIMIZED RECIPE:")
-        output.append(f"📋 INGREDIENTS:")
-        total_weight = 0
-        for ing, qty in recipe.items():
-            output.append(f" • {ing.title()}: {qty:.0f}g")
-            total_weight += qty
-        
-        output.append(f"\n📊 COMPLETE NUTRITION:")
-        output.append(f" 🔥 Calories: {total_calories:.0f}")
-        output.append(f" 💪 Protein: {total_protein:.1f}g")
-        output.append(f" 🍞 Carbs: {total_carbs:.1f}g")
-        output.append(f" 🥑 Fat: {total_fat:.1f}g")
-        output.append(f" ⚖️ Total Weight: {total_weight:.0f}g")
-        output.append(f" 🎯 Target {target_nutrient.title()}: {target_amount:.1f}g")
-        
-        output.append(f"\n👨‍🍳 BASIC PREPARATION GUIDE:")
-        output.append(" 1. Prepare all ingredients by washing and chopping as needed")
-        
-        # Add specific cooking suggestions based on ingredients
-        has_protein = any(ing for ing in sorted_ingredients if ing.protein > 0.15)
-        has_vegetables = any(ing for ing in sorted_ingredients if ing.name.lower() in 
-                            ['broccoli', 'spinach', 'carrots', 'bell pepper', 'kale'])
-        
-        if has_protein:
-            output.append(" 2. Cook proteins first using your preferred method (grill, bake, or sauté)")
-        if has_vegetables:
-            output.append(" 3. Steam or sauté vegetables until tender-crisp")
-        
-        output.append(" 4. Combine ingredients according to your preference")
-        output.append(" 5. Season to taste with salt, pepper, herbs, and spices")
-        output.append(" 6. Serve immediately while hot")
-        
-        return output
+        optimization = custom_optimization(ingredients, max_calories, target_nutrient)
+        return render_custom_optimization(ingredients, optimization)
     
     def update_results(self, output):
         """Update the results text area"""
@@ -790,6 +3734,13 @@ class RecipeGeneratorGUI:
         # Switch to recipe tab to show results
         self.notebook.select(1)
     
+    def append_results(self, text):
+        """Append a streamed chunk to the results text area"""
+        if self.results_text.get(1.0, tk.END).strip():
+            text = "\n" + text
+        self.results_text.insert(tk.END, text)
+        self.results_text.see(tk.END)
+    
     def export_results(self):
         """Export results to a text file"""
         content = self.results_text.get(1.0, tk.END)
@@ -819,16 +3770,19 @@ class RecipeGeneratorGUI:
 class IngredientPresets:
     """Quick presets for common ingredients"""
     
-    PRESETS = {
-        "Chicken Breast (200g)": {"quantity": 200, "calories": 1.65, "protein": 0.31, "carbs": 0.0, "fat": 0.036},
-        "Brown Rice (150g)": {"quantity": 150, "calories": 1.12, "protein": 0.023, "carbs": 0.23, "fat": 0.009},
-        "Broccoli (100g)": {"quantity": 100, "calories": 0.34, "protein": 0.028, "carbs": 0.07, "fat": 0.004},
-        "Sweet Potato (200g)": {"quantity": 200, "calories": 0.86, "protein": 0.02, "carbs": 0.20, "fat": 0.001},
-        "Salmon Fillet (150g)": {"quantity": 150, "calories": 2.08, "protein": 0.25, "carbs": 0.0, "fat": 0.12},
-        "Greek Yogurt (100g)": {"quantity": 100, "calories": 0.97, "protein": 0.17, "carbs": 0.061, "fat": 0.052},
-        "Quinoa (100g)": {"quantity": 100, "calories": 1.20, "protein": 0.044, "carbs": 0.22, "fat": 0.019},
-        "Spinach (50g)": {"quantity": 50, "calories": 0.23, "protein": 0.029, "carbs": 0.036, "fat": 0.004},
-    }
+    # (label, NUTRITION_DB food, grams); nutrition comes from the database
+    _PRESET_PORTIONS = [
+        ("Chicken Breast (200g)", "chicken breast", 200),
+        ("Brown Rice (150g)", "brown rice", 150),
+        ("Broccoli (100g)", "broccoli", 100),
+        ("Sweet Potato (200g)", "sweet potato", 200),
+        ("Salmon Fillet (150g)", "salmon", 150),
+        ("Greek Yogurt (100g)", "greek yogurt", 100),
+        ("Quinoa (100g)", "quinoa", 100),
+        ("Spinach (50g)", "spinach", 50),
+    ]
+    PRESETS = {label: {"quantity": grams, **NUTRITION_DB[food]}
+               for label, food, grams in _PRESET_PORTIONS}
 
 def add_preset_functionality(gui):
     """Add preset buttons to the GUI"""
@@ -929,6 +3883,7 @@ def setup_styling(root):
 # ========================
 def main():
     """Launch the GUI application"""
+    _load_tkinter()
     root = tk.Tk()
     
     # Setup styling
@@ -953,6 +3908,7 @@ def main():
     
     # Start the application
     root.mainloop()
+    app.jobs.shutdown()  # cancel in-flight jobs so exit does not wait on them
 
 # ========================
 # CLI Interface (preserved for compatibility)
@@ -971,13 +3927,40 @@ def interactive():
         print("   3. The fallback database will be used for common ingredients")
         print("\n📚 Available in database:", ", ".join(list(NUTRITION_DB.keys())[:10]), "...")
     
-    # Test API connection
-    working, status = test_api_connection()
-    if not working:
-        print(f"⚠️ API Status: {status}")
-        print("📚 Will use enhanced fallback database where available")
+    # Test API connection (a recent cached answer, or a background probe
+    # reported between prompts, so the first prompt isn't delayed)
+    def report_api_status(working, status):
+        if not working:
+            print(f"⚠️ API Status: {status}")
+            print("📚 Will use enhanced fallback database where available")
+        else:
+            print(f"✅ API Status: {status}")
+    
+    probe_lock = threading.Lock()
+    probe_state = {"result": None, "live": False}
+    
+    def on_probe(result):
+        # Held for the next prompt boundary; printed directly once entry is over
+        with probe_lock:
+            if not probe_state["live"]:
+                probe_state["result"] = result
+                return
+        print()
+        report_api_status(*result)
+    
+    def flush_probe(live: bool = False):
+        with probe_lock:
+            result, probe_state["result"] = probe_state["result"], None
+            probe_state["live"] = live
+        if result is not None:
+            report_api_status(*result)
+    
+    health = cached_api_health()
+    if health is not None:
+        report_api_status(*health)
     else:
-        print(f"✅ API Status: {status}")
+        print("🔍 Checking API status in the background...")
+        start_health_probe(on_probe)
     
     ingredients: List[Ingredient] = []
     
@@ -986,6 +3969,7 @@ def interactive():
     n = int(input("\nHow many ingredients do you have? "))
     
     for i in range(n):
+        flush_probe()
         print(f"\n--- Ingredient {i+1} ---")
         name = input("Name: ").strip()
         
@@ -1030,6 +4014,8 @@ def interactive():
         ingredients.append(Ingredient(name, quantity, calories, protein, carbs, fat))
         print(f"✅ Added: {name}")
     
+    flush_probe(live=True)
+    
     # Get calorie target
     while True:
         try:
@@ -1064,27 +4050,431 @@ def interactive():
     print(f"\n🎯 Optimizing for maximum {target_nutrient.upper()}")
     print("⏳ Searching for recipes and optimizing...")
     
-    # Create a temporary GUI instance for recipe generation
-    class TempGUI:
-        def generate_smart_recipe(self, ingredients, max_calories, target_nutrient):
-            return RecipeGeneratorGUI(None).generate_smart_recipe(ingredients, max_calories, target_nutrient)
-        def display_custom_optimization(self, ingredients, max_calories, target_nutrient):
-            return RecipeGeneratorGUI(None).display_custom_optimization(ingredients, max_calories, target_nutrient)
-    
-    temp_gui = TempGUI()
-    output = temp_gui.generate_smart_recipe(ingredients, max_calories, target_nutrient)
-    print(output)
+    for chunk in stream_generation(ingredients, max_calories, target_nutrient):
+        print(chunk, flush=True)
     
     print(f"\n🎉 Recipe generation complete!")
     print("💡 Tip: Try different target nutrients to see how your meal plan changes!")
 
+# ========================
+# Batch Mode (--batch)
+# ========================
+def batch_record(record: Dict) -> Dict:
+    """Process one meal request.
+    
+    ``{"id": ..., "ingredients": [...], "max_calories": 600, "target_nutrient": "protein",
+    "recipes": true}`` - ingredients are names or objects with ``name`` and
+    optional ``quantity`` (grams) and per-gram ``calories/protein/carbs/fat``;
+    missing nutrition is looked up. ``"recipes": false`` skips the recipe
+    search and returns only the custom optimization.
+    """
+    ingredients = []
+    for item in record["ingredients"]:
+        if isinstance(item, str):
+            item = {"name": item}
+        quantity = float(item.get("quantity", SHOPPING_LIST_DEFAULT_GRAMS))
+        if all(key in item for key in NUTRIENT_FIELDS):
+            nutrition = {key: float(item[key]) for key in NUTRIENT_FIELDS}
+        else:
+            nutrition = fetch_nutrition_api(item["name"])
+        ingredients.append(Ingredient(item["name"], quantity, **nutrition))
+    if not ingredients:
+        raise ValueError("no ingredients")
+    
+    max_calories = float(record["max_calories"])
+    if max_calories <= 0:
+        raise ValueError("max_calories must be positive")
+    target_nutrient = record.get("target_nutrient", "protein")
+    if target_nutrient not in MACRO_CALORIES:
+        raise ValueError(f"unknown target_nutrient {target_nutrient!r}")
+    
+    if record.get("recipes", True):
+        return generate_recipes(ingredients, max_calories, target_nutrient).to_dict()
+    return GenerationResult(ingredients, max_calories, target_nutrient,
+                            custom=custom_optimization(ingredients, max_calories,
+                                                       target_nutrient)).to_dict()
+
+def _process_batch_chunk(chunk: List[tuple]):
+    """Worker task: (line number, raw line) pairs -> (JSONL result lines, error count)"""
+    lines, errors = [], 0
+    for line_no, line in chunk:
+        record_id = line_no
+        try:
+            record = json.loads(line)
+            record_id = record.get("id", line_no)
+            output = {"id": record_id, "ok": True, "result": batch_record(record)}
+        except Exception as e:
+            output = {"id": record_id, "ok": False, "error": f"{type(e).__name__}: {e}"}
+            errors += 1
+        lines.append(json.dumps(output))
+    return lines, errors
+
+def _batch_worker_init(workers: int):
+    """Split the API rate limit between workers and open the shared caches once"""
+    global _api_client
+    _api_client = APIClient(max_workers=max(1, HTTP_MAX_WORKERS // workers),
+                            limiter=TokenBucket(1.0 / MIN_REQUEST_INTERVAL / workers,
+                                                max(1.0, RATE_LIMIT_BURST / workers)))
+    get_nutrition_cache()        # on-disk SQLite cache shared by every worker
+    get_local_recipe_store()     # memory-mapped, so its pages are shared too
+    get_food_db()
+    get_food_matcher()
+
+def _batch_chunks(lines, chunk_size: int):
+    chunk = []
+    for line_no, line in enumerate(lines, 1):
+        if line.strip():
+            chunk.append((line_no, line))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def run_batch(input_stream, output_stream, workers: int = BATCH_WORKERS,
+              chunk_size: int = BATCH_CHUNK_SIZE) -> Dict[str, int]:
+    """Stream JSONL meal requests through a process pool, writing JSONL results.
+    
+    Results keep the input order; a bad record produces an ``"ok": false``
+    line instead of stopping the run. At most ``workers * BATCH_MAX_INFLIGHT``
+    chunks are pending at once, so memory stays flat however long the input.
+    """
+    stats = {"records": 0, "errors": 0}
+    
+    def write(done):
+        lines, errors = done
+        output_stream.write("".join(line + "\n" for line in lines))
+        output_stream.flush()
+        stats["records"] += len(lines)
+        stats["errors"] += errors
+    
+    chunks = _batch_chunks(input_stream, chunk_size)
+    if workers <= 1:
+        for chunk in chunks:
+            write(_process_batch_chunk(chunk))
+        return stats
+    
+    from concurrent.futures import ProcessPoolExecutor
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_batch_worker_init,
+                             initargs=(workers,)) as pool:
+        for chunk in chunks:
+            pending.append(pool.submit(_process_batch_chunk, chunk))
+            if len(pending) >= workers * BATCH_MAX_INFLIGHT:
+                write(pending.popleft().result())
+        while pending:
+            write(pending.popleft().result())
+    return stats
+
+def batch_main(source: str = "-", destination: str = "-"):
+    """--batch entry point; "-" means stdin/stdout"""
+    start = time.time()
+    input_stream = sys.stdin if source == "-" else open(source, encoding="utf-8")
+    output_stream = sys.stdout if destination == "-" else open(destination, "w", encoding="utf-8")
+    try:
+        stats = run_batch(input_stream, output_stream)
+    finally:
+        if input_stream is not sys.stdin:
+            input_stream.close()
+        if output_stream is not sys.stdout:
+            output_stream.close()
+    print(f"✅ Processed {stats['records']} meal requests ({stats['errors']} errors) "
+          f"in {time.time() - start:.1f}s", file=sys.stderr)
+
+# ========================
+# Local HTTP Service
+# ========================
+class RequestCoalescer:
+    """Share one in-flight computation between concurrent identical requests"""
+    
+    def __init__(self):
+        self._inflight: Dict = {}
+        self.coalesced = 0
+    
+    async def run(self, key, func, *args):
+        """Await func(*args) in the default executor, joining an identical in-flight call"""
+        if key in self._inflight:
+            self.coalesced += 1
+            return await asyncio.shield(self._inflight[key])
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(None, func, *args)
+        self._inflight[key] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            self._inflight.pop(key, None)
+
+# Routes served by NutritionService; anything else is labelled "unknown" in
+# metrics so arbitrary client paths can't create new time series
+SERVICE_ROUTES = frozenset([
+    ("GET", "/health"), ("GET", "/stats"), ("GET", "/metrics"), ("GET", "/nutrition"),
+    ("GET", "/recipes"), ("POST", "/optimize"), ("POST", "/generate"), ("POST", "/analyze"),
+    ("POST", "/frontier"),
+])
+
+def _checked_nutrient(name, allowed=tuple(MACRO_CALORIES)) -> str:
+    """Validate a nutrient name from a request (ValueError, i.e. 400, if unknown)"""
+    if name not in allowed:
+        raise ValueError(f"Unknown nutrient {name!r}; expected one of {', '.join(allowed)}")
+    return name
+
+class NutritionService:
+    """Asyncio JSON service exposing lookup, recipe search and optimization.
+    
+    Endpoints:
+        GET  /health
+        GET  /stats
+        GET  /metrics?format=json|prometheus
+        GET  /nutrition?food=chicken+breast
+        GET  /recipes?ingredients=chicken,rice&target=protein
+        POST /optimize   {"ingredients": [...], "max_calories": 500, "target_nutrient": "protein",
+                          "constraints": {...optional PortionConstraints fields...}}
+        POST /generate   {"ingredients": [...], "max_calories": 500, "target_nutrient": "protein"}
+        POST /analyze    {"recipes": [{"title": ..., "ingredients": "1 c rice|2 eggs", ...}],
+                          "use_api": true}
+        POST /frontier   {"ingredients": [...], "target_nutrient": "protein", "cost": "calories"}
+    
+    Errors: 400 for invalid input, 404 for unknown endpoints and foods with
+    no data, 502 when the nutrition API answers with an error and 503
+    while it is unavailable.
+    """
+    
+    def __init__(self, host: str = SERVICE_HOST, port: int = SERVICE_PORT):
+        self.host = host
+        self.port = port
+        self.coalescer = RequestCoalescer()
+        self.recipe_cache = OrderedDict()   # (ingredients, target) -> (timestamp, recipes), LRU
+        self.requests_served = 0
+    
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        return self.server
+    
+    async def serve_forever(self):
+        server = await self.start()
+        async with server:
+            await server.serve_forever()
+    
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                body = b""
+                if int(headers.get("content-length", 0)):
+                    body = await reader.readexactly(int(headers["content-length"]))
+                
+                start = time.perf_counter()
+                status, payload = await self._dispatch(method, target, body)
+                route = (method, urllib.parse.urlsplit(target).path.rstrip("/") or "/")
+                METRICS.observe("service_request_seconds", time.perf_counter() - start,
+                                route=route[1] if route in SERVICE_ROUTES else "unknown")
+                if isinstance(payload, str):   # Prometheus text exposition
+                    data, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4"
+                else:
+                    data, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write((f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+                              f"Content-Type: {content_type}\r\n"
+                              f"Content-Length: {len(data)}\r\n"
+                              f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                              ).encode("latin-1") + data)
+                await writer.drain()
+                self.requests_served += 1
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+    
+    async def _dispatch(self, method: str, target: str, body: bytes):
+        parsed = urllib.parse.urlsplit(target)
+        query = dict(urllib.parse.parse_qsl(parsed.query))
+        route = (method, parsed.path.rstrip("/") or "/")
+        try:
+            payload = json.loads(body) if body else {}
+            if route == ("GET", "/health"):
+                return 200, {"status": "ok"}
+            if route == ("GET", "/stats"):
+                return 200, self.stats()
+            if route == ("GET", "/metrics"):
+                if query.get("format") == "prometheus":
+                    return 200, METRICS.to_prometheus()
+                return 200, METRICS.to_dict()
+            if route == ("GET", "/nutrition"):
+                return 200, await self.nutrition(query["food"])
+            if route == ("GET", "/recipes"):
+                names = [n.strip() for n in query["ingredients"].split(",") if n.strip()]
+                return 200, await self.recipes(names, query.get("target", "protein"))
+            if route == ("POST", "/optimize"):
+                return 200, await self.optimize(payload)
+            if route == ("POST", "/generate"):
+                return 200, await self.generate(payload)
+            if route == ("POST", "/analyze"):
+                return 200, await self.analyze(payload)
+            if route == ("POST", "/frontier"):
+                return 200, await self.frontier(payload)
+            return 404, {"error": f"Unknown endpoint {method} {parsed.path}"}
+        except KeyError as e:
+            return 400, {"error": f"Missing parameter {e}"}
+        except NutritionNotFound as e:
+            return 404, {"error": str(e)}
+        except NutritionAPIError as e:
+            return (503 if e.retryable else 502), {"error": str(e)}
+        except APIUnavailableError as e:
+            return 503, {"error": str(e)}
+        except (TypeError, ValueError) as e:   # includes json.JSONDecodeError
+            return 400, {"error": f"Bad request: {e}"}
+        except Exception as e:
+            return 500, {"error": f"Internal error: {e}"}
+    
+    async def nutrition(self, food: str) -> Dict:
+        key = ("nutrition", clean_food_name(food))
+        nutrition = await self.coalescer.run(key, fetch_nutrition_api, food)
+        return {"food": food, "nutrition": nutrition}
+    
+    async def _search(self, ingredient_names: List[str], target_nutrient: str) -> List[Recipe]:
+        """Recipe search through the shared TTL cache and the coalescer"""
+        if not ingredient_names:
+            raise KeyError("ingredients")
+        key = (tuple(ingredient_names), target_nutrient)
+        cached = self.recipe_cache.get(key)
+        if cached and time.time() - cached[0] < SERVICE_RECIPE_TTL_SECONDS:
+            self.recipe_cache.move_to_end(key)
+            return cached[1]
+        recipes = await self.coalescer.run(("recipes",) + key, search_recipes_by_ingredients,
+                                           ingredient_names, target_nutrient)
+        self.recipe_cache[key] = (time.time(), recipes)
+        self.recipe_cache.move_to_end(key)
+        while len(self.recipe_cache) > SERVICE_RECIPE_CACHE_SIZE:
+            self.recipe_cache.popitem(last=False)
+        return recipes
+    
+    async def recipes(self, ingredient_names: List[str], target_nutrient: str) -> Dict:
+        target_nutrient = _checked_nutrient(target_nutrient)
+        recipes = await self._search(ingredient_names, target_nutrient)
+        return {"recipes": [asdict(r) for r in recipes]}
+    
+    async def optimize(self, payload: Dict) -> Dict:
+        ingredients = [Ingredient(**item) for item in payload["ingredients"]]
+        max_calories = float(payload["max_calories"])
+        target_nutrient = _checked_nutrient(payload.get("target_nutrient", "protein"))
+        constraints = payload.get("constraints")
+        if constraints is not None:
+            constraints = PortionConstraints(max_calories=max_calories, **constraints)
+        loop = asyncio.get_running_loop()
+        optimization = await loop.run_in_executor(
+            None, optimize_portions_cached, ingredients, max_calories,
+            target_nutrient, constraints)
+        return OptimizationResult.from_dict(optimization, target_nutrient, max_calories).to_dict()
+    
+    async def generate(self, payload: Dict) -> Dict:
+        ingredients = [Ingredient(**item) for item in payload["ingredients"]]
+        max_calories = float(payload["max_calories"])
+        target_nutrient = _checked_nutrient(payload.get("target_nutrient", "protein"))
+        recipes = await self._search([ing.name for ing in ingredients], target_nutrient)
+        
+        def build() -> GenerationResult:
+            result = GenerationResult(ingredients, max_calories, target_nutrient)
+            if not recipes:
+                result.custom = custom_optimization(ingredients, max_calories, target_nutrient)
+            for recipe in recipes:
+                optimization = optimize_for_recipe(recipe, ingredients, max_calories,
+                                                   target_nutrient)
+                result.recipes.append(RecipeSuggestion(recipe, OptimizationResult.from_dict(
+                    optimization, target_nutrient, max_calories)))
+            return result
+        
+        loop = asyncio.get_running_loop()
+        return (await loop.run_in_executor(None, build)).to_dict()
+    
+    async def analyze(self, payload: Dict) -> Dict:
+        recipes = [Recipe(item.get("title", "Unknown Recipe"), item["ingredients"],
+                          item.get("instructions", ""), item.get("servings", ""))
+                   for item in payload["recipes"]]
+        loop = asyncio.get_running_loop()
+        analysis = await loop.run_in_executor(None, analyze_recipes, recipes,
+                                              bool(payload.get("use_api", True)))
+        return {"recipes": analysis.to_dicts()}
+    
+    async def frontier(self, payload: Dict) -> Dict:
+        ingredients = [Ingredient(**item) for item in payload["ingredients"]]
+        target_nutrient = _checked_nutrient(payload.get("target_nutrient", "protein"),
+                                            NUTRIENT_FIELDS)
+        cost = _checked_nutrient(payload.get("cost", "calories"), NUTRIENT_FIELDS)
+        loop = asyncio.get_running_loop()
+        frontier = await loop.run_in_executor(None, pareto_frontier, ingredients,
+                                              target_nutrient, cost)
+        return frontier.to_dict()
+    
+    def stats(self) -> Dict:
+        return {
+            "requests_served": self.requests_served,
+            "coalesced_requests": self.coalescer.coalesced,
+            "inflight": len(self.coalescer._inflight),
+            "recipe_cache_entries": len(self.recipe_cache),
+            "nutrition_cache": get_nutrition_cache().stats(),
+            "optimization_cache": get_optimization_cache().stats(),
+            "api_circuits": {endpoint: breaker.state
+                             for endpoint, breaker in get_api_client().breakers.items()},
+        }
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error",
+                502: "Bad Gateway", 503: "Service Unavailable"}
+
+def serve(host: str = SERVICE_HOST, port: int = SERVICE_PORT):
+    """Run the optimizer as a long-lived local JSON service"""
+    print(f"🍽️ Nutrition service listening on http://{host}:{port}")
+    print("   Endpoints: /health /stats /metrics /nutrition /recipes /optimize /generate /analyze /frontier")
+    try:
+        asyncio.run(NutritionService(host, port).serve_forever())
+    except KeyboardInterrupt:
+        print("\n👋 Service stopped")
+
 if __name__ == "__main__":
     import sys
     
+    # --profile[=out.prof] prints a per-stage timing breakdown at exit
+    # (and captures cProfile data when a file is given)
+    profile_flag = next((arg for arg in sys.argv[1:] if arg.split("=")[0] == "--profile"), None)
+    if profile_flag is not None:
+        sys.argv.remove(profile_flag)
+        start_profiling(profile_flag.partition("=")[2] or None)
+    
     # Check if user wants GUI or CLI
     if len(sys.argv) > 1 and sys.argv[1] == "--cli":
         interactive()
+    elif len(sys.argv) > 2 and sys.argv[1] == "--import-recipes":
+        store_path = sys.argv[3] if len(sys.argv) > 3 else LOCAL_RECIPE_STORE_PATH
+        count = build_recipe_store(sys.argv[2], store_path)
+        print(f"✅ Stored {count} recipes in {store_path}")
+    elif len(sys.argv) > 2 and sys.argv[1] == "--import-foods":
+        db_path = sys.argv[3] if len(sys.argv) > 3 else LOCAL_FOOD_DB_PATH
+        skipped = []
+        count = build_food_db(sys.argv[2], db_path, skipped)
+        print(f"✅ Stored {count} foods in {db_path}")
+        if skipped:
+            print(f"⚠️ Skipped {len(skipped)} invalid rows", file=sys.stderr)
+            for line_no, reason in skipped[:10]:
+                print(f"   line {line_no}: {reason}", file=sys.stderr)
+    elif len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        batch_main(sys.argv[2] if len(sys.argv) > 2 else "-",
+                   sys.argv[3] if len(sys.argv) > 3 else "-")
+    elif len(sys.argv) > 1 and sys.argv[1] == "--serve":
+        serve(port=int(sys.argv[2]) if len(sys.argv) > 2 else SERVICE_PORT)
     else:
         print("🍽️ Starting Smart Nutritional Recipe Generator GUI...")
-        print("💡 Use --cli flag to run the command-line interface instead")
+        print("💡 Use --cli flag to run the command-line interface, or --serve [port] for the JSON service")
+        print("💡 Use --batch [in.jsonl|-] [out.jsonl|-] to process meal requests in bulk")
+        print("💡 Add --profile[=out.prof] to print a per-stage timing breakdown on exit")
         main()
\ No newline at end of file